@@ -0,0 +1,121 @@
+"""Cold start benchmark: boots `python -m src.main` like a scale-to-zero deploy would.
+
+A /start message is queued on the fake Bot API before the bot process exists;
+the clock runs from spawning the process until the fake API sees the bot's
+reply (sendMessage), i.e. what a student waking the bot up experiences, minus
+Telegram's network hop. Also prints the bot's own startup breakdown.
+
+    python -m bench.coldstart --posts 100000 --runs 5
+
+The database is generated once per size (bench.db_bench data) and copied per run.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+
+USER_ID = 10_000_001
+
+def start_update():
+    return {"update_id": 1, "message": {
+        "message_id": 1,
+        "date": int(time.time()),
+        "chat": {"id": USER_ID, "type": "private"},
+        "from": {"id": USER_ID, "is_bot": False, "first_name": "Cold"},
+        "text": "/start",
+        "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+    }}
+
+def prepare_db(data_dir, posts):
+    """Returns a path to a DB with `posts` synthetic posts (None = start from an empty file)."""
+    if not posts:
+        return None
+    source = os.path.join(data_dir, f"coldstart_{posts}.db")
+    if not os.path.exists(source):
+        print(f"generating {posts:,} posts ...", flush=True)
+        env = {**os.environ, "BOT_TOKEN": "1:x", "DB_PATH": source}
+        code = ("from src import database as db; from bench.db_bench import generate; "
+                f"generate(db.DB_PATH, {posts}, db.init_db); db.close_connection()")
+        subprocess.run([sys.executable, "-c", code], env=env, check=True, stderr=subprocess.DEVNULL)
+    return source
+
+def run_once(api_url, source, workdir):
+    db_path = os.path.join(workdir, "market.db")
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    if source:
+        shutil.copyfile(source, db_path)
+
+    with httpx.Client(base_url=api_url) as client:
+        client.post("/reset")
+        client.post("/updates", json=[start_update()])
+        env = {**os.environ, "BOT_TOKEN": "123456:COLDSTART", "BOT_MODE": "polling", "BOT_API_URL": api_url,
+               "DB_PATH": db_path}
+        started = time.perf_counter()
+        bot = subprocess.Popen([sys.executable, "-m", "src.main"], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        try:
+            while client.get("/stats").json().get("sendMessage", 0) < 1:
+                if bot.poll() is not None:
+                    raise RuntimeError(f"bot exited early:\n{bot.stderr.read()}")
+                if time.perf_counter() - started > 60:
+                    raise RuntimeError("no reply within 60s")
+                time.sleep(0.005)
+            first_reply = time.perf_counter() - started
+        finally:
+            bot.terminate()
+            try:
+                _, stderr = bot.communicate(timeout=10)
+            except subprocess.TimeoutExpired:
+                bot.kill()
+                _, stderr = bot.communicate()
+    breakdown = next((line.split("Startup: ", 1)[1] for line in stderr.splitlines() if "Startup: " in line), "?")
+    return first_reply, breakdown
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=100_000, help="synthetic posts in the DB (0 = empty DB)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=18082)
+    parser.add_argument("--data-dir", default=os.path.join(tempfile.gettempdir(), "bench_data"))
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    from bench.fake_bot_api import serve
+    from bench.loadtest import wait_for_api
+    api_url = f"http://127.0.0.1:{args.port}"
+    server = multiprocessing.Process(target=serve, args=(args.port, 0), daemon=True)
+    server.start()
+    os.makedirs(args.data_dir, exist_ok=True)
+    workdir = tempfile.mkdtemp(prefix="coldstart_")
+    try:
+        asyncio.run(wait_for_api(api_url))
+        source = prepare_db(args.data_dir, args.posts)
+        results = []
+        for run in range(1, args.runs + 1):
+            seconds, breakdown = run_once(api_url, source, workdir)
+            results.append(seconds)
+            print(f"run {run}: first reply {seconds * 1000:.0f} ms after spawn | {breakdown}", flush=True)
+    finally:
+        server.terminate()
+        server.join()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{args.posts:,} posts: first reply median {statistics.median(results) * 1000:.0f} ms, "
+          f"worst {max(results) * 1000:.0f} ms over {len(results)} runs")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"posts": args.posts, "first_reply_s": results}, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
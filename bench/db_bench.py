@@ -0,0 +1,299 @@
+"""Micro-benchmarks for every query helper in src.database, at realistic data sizes.
+
+A synthetic data generator fills users, posts, feedback, blacklist, interactions
+and persistence for each size (posts = size; users = size/4; feedback and
+interactions = size/2; blacklist = size/100), then every helper is timed:
+
+* latency: repeated single calls (p50 / p99 / mean),
+* throughput: calls/s with 1, 4 and 16 threads calling at once (they share the
+  bot's single connection, so this shows how well the lock holds up).
+
+    python -m bench.db_bench --sizes 10k,100k            # -> bench/results/db_<timestamp>.json
+    python -m bench.db_bench --sizes 1m --data-dir /tmp/dbbench   # keeps generated DBs for reuse
+    python -m bench.db_bench --compare old.json new.json
+
+Write helpers run against a scratch copy, so every run starts from the same data.
+"""
+import argparse
+import datetime
+import inspect
+import json
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+THREADS = (1, 4, 16)
+SEED = 1234
+
+WORDS = ("calculator", "laptop", "charger", "wallet", "keys", "book", "physics", "chemistry", "phone",
+         "headphones", "mattress", "lamp", "kettle", "bag", "umbrella", "jacket", "watch", "mouse",
+         "keyboard", "monitor", "notebook", "bottle", "id", "card", "glasses", "shoes", "table", "chair")
+CAMPUSES = ("🏫 Main Campus", "🏥 Health Campus", "🏗️ Mehal Meda", "🏠 Outside")
+STATUSES = (("APPROVED", 60), ("SOLD", 20), ("REJECTED", 10), ("PENDING", 5), ("EXPIRED", 5))
+TYPES = (("SELL", 70), ("LOST", 15), ("FOUND", 15))
+
+# Helpers that are not queries (connection plumbing, pure parsing)
+NOT_BENCHMARKED = {"get_connection", "close_connection", "db_session", "parse_post_content"}
+
+# --- DATA GENERATOR ---
+
+def _weighted(rng, table):
+    return rng.choices([value for value, _ in table], [weight for _, weight in table])[0]
+
+def _timestamp(rng, now, max_days=90):
+    return (now - datetime.timedelta(seconds=rng.randint(0, max_days * 86400))).strftime("%Y-%m-%d %H:%M:%S")
+
+def generate(path, size, init_db):
+    """Creates the schema through src.database.init_db, then bulk-loads synthetic rows."""
+    rng = random.Random(SEED)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    n_users, n_side = max(size // 4, 1), max(size // 2, 1)
+    init_db()
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA synchronous=OFF")
+    with conn:
+        conn.executemany(
+            "INSERT INTO users (user_id, username, is_seller, real_name, phone_number, id_number, location, joined_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((uid, f"user{uid}", rng.random() < 0.7, f"Student {uid}", f"09{uid:08d}", f"DBU{uid % 10**7:07d}",
+              rng.choice(CAMPUSES), _timestamp(rng, now, 365)) for uid in range(1, n_users + 1)))
+
+        def posts():
+            for _ in range(size):
+                type_ = _weighted(rng, TYPES)
+                title = " ".join(rng.sample(WORDS, 2))
+                location = rng.choice(CAMPUSES) + (" - Library" if type_ != "SELL" else "")
+                desc = " ".join(rng.choices(WORDS, k=8))
+                content = f"{title}\nLocation: {location}\n{desc}" if type_ != "SELL" else f"{title}\n{desc}"
+                yield (rng.randint(1, n_users), type_, "LostFound" if type_ != "SELL" else rng.choice(("Books", "Electronics", "Tools")),
+                       "Used" if type_ == "SELL" else "N/A", content, title, location, desc, "photo",
+                       str(rng.randint(50, 5000)), _weighted(rng, STATUSES), rng.randint(1, 10**6), _timestamp(rng, now))
+        conn.executemany(
+            "INSERT INTO posts (user_id, type, category, condition, content, title, location, description, photo_id, "
+            "price, status, message_id, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", posts())
+        conn.execute("INSERT INTO posts_fts (rowid, body, category) SELECT post_id, content, category FROM posts "
+                     "WHERE status = 'APPROVED'")
+        conn.execute("UPDATE posts SET published_at = created_at WHERE status != 'PENDING'")
+
+        conn.executemany("INSERT INTO feedback (user_id, content, created_at) VALUES (?, ?, ?)",
+                         ((rng.randint(1, n_users), "Nice bot, please add dark mode", _timestamp(rng, now))
+                          for _ in range(n_side)))
+        conn.executemany("INSERT INTO interactions (buyer_id, seller_id, post_id, created_at) VALUES (?, ?, ?, ?)",
+                         ((rng.randint(1, n_users), rng.randint(1, n_users), rng.randint(1, size), _timestamp(rng, now))
+                          for _ in range(n_side)))
+        conn.executemany("INSERT OR IGNORE INTO blacklist (user_id) VALUES (?)",
+                         ((rng.randint(1, n_users),) for _ in range(max(size // 100, 1))))
+        conn.executemany("INSERT INTO persistence (kind, key, data) VALUES (?, ?, ?)",
+                         (("user", str(uid), '{"lang": "en"}') for uid in range(1, min(n_users, 5000) + 1)))
+    conn.close()
+
+# --- BENCHMARKS: helper name -> args factory(rng, size) ---
+
+def _search(rng, size):
+    return (f'"{rng.choice(WORDS)}"*',)
+
+def benchmarks(db):
+    users = lambda size: max(size // 4, 1)
+    return {
+        "init_db": lambda rng, size: (),
+        "get_user": lambda rng, size: (rng.randint(1, users(size)),),
+        "register_seller": lambda rng, size: (rng.randint(1, users(size)), "u", "Bench User", "0911000000", "DBU0000001", "Main"),
+        "count_users": lambda rng, size: (),
+        "get_users_page": lambda rng, size: (rng.randint(1, users(size)),),
+        "create_post": lambda rng, size: (rng.randint(1, users(size)), "SELL", "Books", "Used", "Bench item", "Main", "desc", "100", "photo"),
+        "transition_post": lambda rng, size: (rng.randint(1, size), "PENDING", "APPROVED"),
+        "update_post_message_id": lambda rng, size: (rng.randint(1, size), 42),
+        "get_post": lambda rng, size: (rng.randint(1, size),),
+        "count_pending_posts": lambda rng, size: (),
+        "get_pending_posts": lambda rng, size: (),
+        "bulk_update_status": lambda rng, size: ([rng.randint(1, size) for _ in range(20)], "PENDING", "REJECTED"),
+        "renew_post": lambda rng, size: (rng.randint(1, size),),
+        "get_expired_posts": lambda rng, size: (30 * 86400,),
+        "get_unpublished_posts": lambda rng, size: (86400, 3),
+        "record_publish_failure": lambda rng, size: (rng.randint(1, size),),
+        "get_open_lost_found_posts": lambda rng, size: (),
+        "backfill_post_fields": lambda rng, size: (),
+        "archive_closed_posts": lambda rng, size: (30,),
+        "archive_old_feedback": lambda rng, size: (30,),
+        "search_posts": _search,
+        "get_post_times_since": lambda rng, size: (86400,),
+        "get_user_channel_posts": lambda rng, size: (rng.randint(1, users(size)),),
+        "delete_user_data": lambda rng, size: (rng.randint(1, users(size)),),
+        "load_blacklist": lambda rng, size: (),
+        "add_to_blacklist": lambda rng, size: (users(size) + rng.randint(1, 10**6),),
+        "is_blacklisted": lambda rng, size: (rng.randint(1, users(size)),),
+        "log_feedback": lambda rng, size: (rng.randint(1, users(size)), "Bench feedback"),
+        "get_feedback_times_since": lambda rng, size: (86400,),
+        "export_csv_chunk": lambda rng, size: ("posts", os.devnull, rng.randint(0, size)),
+        "load_persistence": lambda rng, size: (),
+        "save_persistence": lambda rng, size: ([("user", str(rng.randint(1, users(size))), "{}")], []),
+    }
+
+def check_coverage(db, benches):
+    """Every public helper must be benchmarked (or explicitly excluded)."""
+    helpers = {name for name, obj in vars(db).items()
+               if inspect.isfunction(obj) and obj.__module__ == db.__name__ and not name.startswith("_")}
+    return sorted(helpers - set(benches) - NOT_BENCHMARKED)
+
+# --- MEASUREMENT ---
+
+def measure_latency(func, make_args, rng, size, seconds, max_calls=5000):
+    timings = []
+    deadline = time.perf_counter() + seconds
+    while not timings or (time.perf_counter() < deadline and len(timings) < max_calls):
+        args = make_args(rng, size)
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {
+        "calls": len(timings),
+        "p50_ms": round(timings[len(timings) // 2] * 1000, 4),
+        "p99_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000, 4),
+        "mean_ms": round(statistics.fmean(timings) * 1000, 4),
+    }
+
+def measure_throughput(func, make_args, size, threads, seconds):
+    counts = [0] * threads
+    stop = threading.Event()
+
+    def worker(index):
+        rng = random.Random(SEED + index)
+        while not stop.is_set():
+            func(*make_args(rng, size))
+            counts[index] += 1
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker_thread in workers:
+        worker_thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for worker_thread in workers:
+        worker_thread.join()
+    return round(sum(counts) / (time.perf_counter() - start), 1)
+
+def _remove_db(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def run_size(db, label, size, data_dir, seconds, only):
+    # Keyed by schema version: data generated for an older schema is never reused
+    source = os.path.join(data_dir, f"bench_{label}_v{db.SCHEMA_VERSION}.db")
+    if not os.path.exists(source):
+        print(f"[{label}] generating {size:,} posts ...", flush=True)
+        db.DB_PATH = source
+        started = time.perf_counter()
+        generate(source, size, db.init_db)
+        db.close_connection()
+        print(f"[{label}] generated in {time.perf_counter() - started:.1f}s", flush=True)
+
+    benches = benchmarks(db)
+    results = []
+    for name, make_args in benches.items():
+        if only and name not in only:
+            continue
+        # Fresh copy per helper: writes from one benchmark never skew the next
+        scratch = os.path.join(data_dir, f"scratch_{label}.db")
+        db.close_connection()
+        _remove_db(scratch)
+        shutil.copyfile(source, scratch)
+        db.DB_PATH = scratch
+        db.load_blacklist()
+
+        func = getattr(db, name)
+        rng = random.Random(SEED)
+        latency = measure_latency(func, make_args, rng, size, seconds)
+        throughput = {str(n): measure_throughput(func, make_args, size, n, seconds / 2) for n in THREADS}
+        results.append({"function": name, "size": label, "rows": size, "latency": latency, "throughput": throughput})
+        print(f"[{label}] {name:<28} p50 {latency['p50_ms']:>9.3f} ms  p99 {latency['p99_ms']:>9.3f} ms  "
+              + "  ".join(f"{n}t {ops:>9.0f}/s" for n, ops in throughput.items()), flush=True)
+
+    db.close_connection()
+    _remove_db(os.path.join(data_dir, f"scratch_{label}.db"))
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+# --- COMPARE ---
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = {(r["function"], r["size"]): r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = {(r["function"], r["size"]): r for r in json.load(f)["results"]}
+    print(f"{'function':<28}{'size':>6}{'p50 old':>11}{'p50 new':>11}{'change':>9}{'1t/s old':>11}{'1t/s new':>11}")
+    for key in sorted(old.keys() & new.keys()):
+        a, b = old[key], new[key]
+        before, after = a["latency"]["p50_ms"], b["latency"]["p50_ms"]
+        change = f"{(after - before) / before:+.0%}" if before else "n/a"
+        print(f"{key[0]:<28}{key[1]:>6}{before:>11.3f}{after:>11.3f}{change:>9}"
+              f"{a['throughput']['1']:>11.0f}{b['throughput']['1']:>11.0f}")
+
+# --- MAIN ---
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks every src.database helper on synthetic data.")
+    parser.add_argument("--sizes", default="10k,100k", help="comma separated: " + ",".join(SIZES))
+    parser.add_argument("--seconds", type=float, default=1.0, help="time budget per helper and measurement")
+    parser.add_argument("--only", help="comma separated helper names")
+    parser.add_argument("--data-dir", help="where generated DBs are kept (reused across runs)")
+    parser.add_argument("--out", help="JSON results path (default bench/results/db_<timestamp>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="diff two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return 0
+
+    os.environ.setdefault("BOT_TOKEN", "123456:BENCH")
+    from src import database as db
+
+    benches = benchmarks(db)
+    missing = check_coverage(db, benches)
+    if missing:
+        print(f"⚠️ No benchmark for: {', '.join(missing)} (add them to bench/db_bench.py)")
+
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="dbbench_")
+    os.makedirs(data_dir, exist_ok=True)
+    only = set(args.only.split(",")) if args.only else None
+    results = []
+    for label in args.sizes.lower().split(","):
+        results += run_size(db, label, SIZES[label], data_dir, args.seconds, only)
+    if not args.data_dir:
+        shutil.rmtree(data_dir)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "sqlite": sqlite3.sqlite_version,
+            "seconds_per_measurement": args.seconds,
+            "threads": list(THREADS),
+        },
+        "results": results,
+    }
+    out = args.out or os.path.join("bench", "results", f"db_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {out}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""Minimal stand-in for api.telegram.org, for load tests.
+
+Answers every Bot API method the bot uses with a plausible result, optionally
+after a fixed delay (to mimic Telegram's round trip), and counts calls per
+method. GET /stats returns the counts, POST /reset clears them. Updates POSTed
+to /updates (a JSON list) are handed out by getUpdates, for polling-mode runs.
+
+    python -m bench.fake_bot_api --port 8081 --latency-ms 40
+"""
+import argparse
+import asyncio
+import collections
+import itertools
+import time
+from urllib.parse import parse_qsl
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "LoadTest", "username": "loadtest_bot",
+            "can_join_groups": True, "can_read_all_group_messages": False, "supports_inline_queries": False}
+
+def create_app(latency=0.0):
+    calls = collections.Counter()
+    message_ids = itertools.count(1)
+    updates = []
+
+    def message_for(params):
+        chat_id = int(params.get("chat_id", 0) or 0)
+        message = {
+            "message_id": next(message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private" if chat_id > 0 else "channel"},
+        }
+        if "caption" in params:
+            message["caption"] = params["caption"]
+        elif "text" in params:
+            message["text"] = params["text"]
+        return message
+
+    async def bot_method(request):
+        method = request.path_params["method"]
+        calls[method] += 1
+        content_type = request.headers.get("content-type", "")
+        if content_type.startswith("application/json"):
+            params = await request.json()
+        elif content_type.startswith("application/x-www-form-urlencoded"):
+            params = dict(parse_qsl((await request.body()).decode()))
+        else:
+            params = {}  # multipart uploads (sendDocument, ...) are only counted
+        if latency:
+            await asyncio.sleep(latency)
+
+        if method == "getMe":
+            result = BOT_USER
+        elif method == "getUpdates":
+            result = await next_updates(int(params.get("offset", 0) or 0), float(params.get("timeout", 0) or 0))
+        elif method.startswith(("send", "edit", "copyMessage", "forwardMessage")):
+            result = message_for(params)
+        else:
+            result = True  # answerCallbackQuery, deleteMessage, setWebhook, ...
+        return JSONResponse({"ok": True, "result": result})
+
+    async def next_updates(offset, timeout):
+        deadline = time.monotonic() + timeout
+        while True:
+            pending = [update for update in updates if update["update_id"] >= offset]
+            if pending or time.monotonic() >= deadline:
+                return pending
+            await asyncio.sleep(0.01)
+
+    async def enqueue(request):
+        updates.extend(await request.json())
+        return JSONResponse({})
+
+    async def stats(request):
+        return JSONResponse(dict(calls))
+
+    async def reset(request):
+        calls.clear()
+        return JSONResponse({})
+
+    return Starlette(routes=[
+        Route("/bot{token}/{method}", bot_method, methods=["GET", "POST"]),
+        Route("/stats", stats),
+        Route("/reset", reset, methods=["POST"]),
+        Route("/updates", enqueue, methods=["POST"]),
+    ])
+
+def serve(port, latency_ms=0):
+    uvicorn.run(create_app(latency_ms / 1000), host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    serve(args.port, args.latency_ms)
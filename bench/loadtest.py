@@ -0,0 +1,292 @@
+"""Offline load test: the real Application from src.main against a fake Bot API.
+
+Thousands of synthetic users replay scripted conversations concurrently
+(registration + sell, I Lost, I Found with the inline registration), then an
+admin approves every pending post. Each user waits for the bot to finish one
+update before sending the next, like a real chat. Reports updates/s, p50/p99
+latency (enqueue -> all handlers done) and Bot API calls per published post.
+
+    python -m bench.loadtest --users 2000 --api-latency-ms 40
+    python -m bench.loadtest --users 500 --telegram-limits   # keep the real send limits
+
+Everything runs against a throwaway database; nothing touches data/market.db.
+Bot logs go to stderr as in production, the report to stdout.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import tempfile
+import time
+import httpx
+
+ADMIN_GROUP_ID = -1001000000001
+CHANNEL_ID = -1001000000002
+FIRST_USER_ID = 10_000_000
+
+# --- SCRIPTS (one list of steps per persona; a step is (kind, payload)) ---
+
+def registration_steps(i):
+    return [
+        ("text", "🛒 Marketplace"),
+        ("text", "📝 Register"),
+        ("contact", None),
+        ("text", f"Load Tester {i}"),
+        ("text", "🏫 Main Campus"),
+        ("text", "🎓 University ID"),
+        ("text", f"DBU{i % 10_000_000:07d}"),
+    ]
+
+def sell_steps(i):
+    return [
+        ("text", "➕ Sell Item"),
+        ("photo", None),
+        ("text", f"Scientific calculator {i}"),
+        ("text", str(100 + i % 900)),
+        ("text", "👌 Used"),
+        ("text", "📚 Books"),
+        ("text", "Works fine, small scratch on the cover."),
+        ("text", "✅ Submit"),
+    ]
+
+def lost_steps(i):
+    return [
+        ("text", "🔍 Lost & Found"),
+        ("text", "📢 I Lost"),
+        ("text", f"Blue wallet {i % 50}"),
+        ("text", "🏫 Main Campus"),
+        ("text", "Near Block 204"),
+        ("text", "Leather, has my student ID inside"),
+        ("text", "⏩ Skip Photo"),
+        ("text", "✅ Submit"),
+    ]
+
+def found_steps(i):
+    return [
+        ("text", "🔍 Lost & Found"),
+        ("text", "🙋‍♂️ I Found"),
+        ("contact", None),
+        ("text", f"Finder {i}"),
+        ("text", "🏥 Health Campus"),
+        ("text", "🎓 University ID"),
+        ("text", f"DBU{i % 10_000_000:07d}"),
+        ("text", f"Blue wallet {i % 50}"),
+        ("text", "🏫 Main Campus"),
+        ("text", "Library 2nd floor"),
+        ("text", "Leather wallet"),
+        ("photo", None),
+        ("text", "✅ Submit"),
+    ]
+
+PERSONAS = (
+    ("sell", lambda i: registration_steps(i) + sell_steps(i)),
+    ("sell", lambda i: registration_steps(i) + sell_steps(i)),
+    ("lost", lost_steps),
+    ("found", found_steps),
+)
+
+# --- UPDATE FACTORY ---
+
+class Driver:
+    """Feeds updates into the Application and times them until every handler group has run."""
+
+    def __init__(self, app):
+        self.app = app
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.inflight = {}
+        self.latencies = []
+
+    def user(self, user_id):
+        return {"id": user_id, "is_bot": False, "first_name": f"U{user_id}", "username": f"user{user_id}"}
+
+    def message(self, user_id, kind, payload):
+        message = {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": self.user(user_id),
+        }
+        if kind == "text":
+            message["text"] = payload
+        elif kind == "contact":
+            message["contact"] = {"phone_number": f"+2519{user_id % 100_000_000:08d}",
+                                  "first_name": f"U{user_id}", "user_id": user_id}
+        elif kind == "photo":
+            message["photo"] = [{"file_id": f"photo-{user_id}", "file_unique_id": f"p{user_id}",
+                                 "width": 640, "height": 480}]
+        return {"message": message}
+
+    def approval(self, admin_id, post_id):
+        return {"callback_query": {
+            "id": str(next(self.update_ids)),
+            "from": self.user(admin_id),
+            "chat_instance": "admins",
+            "data": f"approve_{post_id}",
+            "message": {
+                "message_id": next(self.message_ids),
+                "date": int(time.time()),
+                "chat": {"id": ADMIN_GROUP_ID, "type": "supergroup"},
+                "text": f"🚨 NEW POST APPROVAL #{post_id}",
+            },
+        }}
+
+    async def send(self, body):
+        from telegram import Update
+        update_id = next(self.update_ids)
+        update = Update.de_json({"update_id": update_id, **body}, self.app.bot)
+        done = asyncio.get_running_loop().create_future()
+        self.inflight[update_id] = (time.perf_counter(), done)
+        await self.app.update_queue.put(update)
+        await done
+
+    async def finished(self, update, context):
+        """Registered as the very last handler group: the update has been fully processed."""
+        started, done = self.inflight.pop(update.update_id)
+        self.latencies.append(time.perf_counter() - started)
+        done.set_result(None)
+
+async def run_user(driver, user_id, steps):
+    for kind, payload in steps:
+        await driver.send(driver.message(user_id, kind, payload))
+
+# --- REPORTING ---
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def phase_report(name, latencies, seconds):
+    return {
+        "phase": name,
+        "updates": len(latencies),
+        "seconds": round(seconds, 3),
+        "updates_per_s": round(len(latencies) / seconds, 1) if seconds else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2) if latencies else 0.0,
+    }
+
+async def fetch_api_calls(api_url):
+    async with httpx.AsyncClient() as client:
+        return (await client.get(f"{api_url}/stats")).json()
+
+async def wait_for_api(api_url, timeout=10):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while True:
+            try:
+                await client.get(f"{api_url}/stats")
+                return
+            except httpx.TransportError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.05)
+
+# --- MAIN ---
+
+async def run(args, api_url):
+    from telegram import Update
+    from telegram.ext import TypeHandler
+    from src import main as bot_main, repository
+    from src.sender import SendScheduler
+
+    # Unless asked otherwise measure the bot itself, not Telegram's send limits
+    limiter = None if args.telegram_limits else SendScheduler(
+        overall_rate=1e9, private_rate=1e9, private_burst=1e9, group_rate=1e9, group_burst=1e9)
+    app = bot_main.build_application(rate_limiter=limiter)
+    driver = Driver(app)
+    app.add_handler(TypeHandler(Update, driver.finished), group=10**6)
+
+    await wait_for_api(api_url)
+    report = {"users": args.users, "api_latency_ms": args.api_latency_ms,
+              "telegram_limits": args.telegram_limits, "phases": []}
+    async with app:
+        await app.post_init(app)  # background warm-up / migrations, as in run_polling / run_webhook
+        await app.start()
+        try:
+            # Phase 1: every user runs their conversation concurrently
+            personas = [PERSONAS[i % len(PERSONAS)] for i in range(args.users)]
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                run_user(driver, FIRST_USER_ID + i, script(i)) for i, (_, script) in enumerate(personas)
+            ))
+            report["phases"].append(phase_report("conversations", driver.latencies, time.perf_counter() - started))
+
+            # Phase 2: an admin approves the whole queue, one button press at a time per admin
+            driver.latencies = []
+            pending = await repository.get_pending_posts(limit=args.users * 2)
+            admin_id = bot_main.ADMIN_IDS[0]
+            started = time.perf_counter()
+            for post in pending:
+                await driver.send(driver.approval(admin_id, post['post_id']))
+            report["phases"].append(phase_report("approvals", driver.latencies, time.perf_counter() - started))
+        finally:
+            await app.stop()
+
+    calls = await fetch_api_calls(api_url)
+    published = len(pending)
+    report["posts_published"] = published
+    report["api_calls"] = dict(sorted(calls.items(), key=lambda item: -item[1]))
+    report["api_calls_per_post"] = round(sum(calls.values()) / published, 2) if published else None
+    return report
+
+def print_report(report):
+    print(f"\nLoad test: {report['users']} users, fake API latency {report['api_latency_ms']} ms, "
+          f"Telegram send limits {'ON' if report['telegram_limits'] else 'OFF'}")
+    print(f"{'phase':<15}{'updates':>9}{'seconds':>10}{'upd/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for phase in report["phases"]:
+        print(f"{phase['phase']:<15}{phase['updates']:>9}{phase['seconds']:>10}{phase['updates_per_s']:>10}"
+              f"{phase['p50_ms']:>10}{phase['p99_ms']:>10}")
+    print(f"\nPosts published: {report['posts_published']} | "
+          f"Bot API calls per published post: {report['api_calls_per_post']}")
+    print("API calls: " + ", ".join(f"{method}={count}" for method, count in report["api_calls"].items()))
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline load test against a fake Bot API.")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--api-latency-ms", type=float, default=0, help="simulated Telegram round trip")
+    parser.add_argument("--telegram-limits", action="store_true", help="keep the real send scheduler limits")
+    parser.add_argument("--port", type=int, default=18081)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    from bench.fake_bot_api import serve
+    api_url = f"http://127.0.0.1:{args.port}"
+    server = multiprocessing.Process(target=serve, args=(args.port, args.api_latency_ms), daemon=True)
+    server.start()
+
+    workdir = tempfile.mkdtemp(prefix="loadtest_")
+    # src.config reads these at import time, so they are set before any src import
+    os.environ.update({
+        "BOT_TOKEN": "123456:LOADTEST",
+        "BOT_MODE": "polling",
+        "BOT_API_URL": api_url,
+        "ADMIN_GROUP_ID": str(ADMIN_GROUP_ID),
+        "CHANNEL_ID": str(CHANNEL_ID),
+        "DB_PATH": os.path.join(workdir, "market.db"),
+        "POST_LIMIT": "1000",
+    })
+    try:
+        from src import main as bot_main, repository
+        bot_main.load_state()
+        report = asyncio.run(run(args, api_url))
+        repository.shutdown()
+    finally:
+        server.terminate()
+        server.join()
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
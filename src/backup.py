@@ -0,0 +1,225 @@
+"""Online SQLite backups (scheduled from src.main) and the restore command.
+
+A backup copies the live DB with SQLite's backup API, PAGES_PER_STEP pages at a
+time, from a worker thread with its own connection. It pauses between steps so
+the DB thread's writes go through. The copy is gzip-compressed and verified by
+decompressing it and running PRAGMA integrity_check. Only then is it kept and
+the oldest backups rotated out.
+
+    python -m src.backup now                                 # same as the scheduled job
+    python -m src.backup list
+    python -m src.backup verify market-20260301-030000.db.gz
+    python -m src.backup restore market-20260301-030000.db.gz # stop the bot first
+"""
+import asyncio
+import datetime
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import time
+from src.config import DB_PATH, BACKUP_DIR, BACKUP_KEEP
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+PAGES_PER_STEP = 256        # 1 MB with 4 KB pages: a step holds the read lock for milliseconds
+STEP_PAUSE = 0.05           # seconds between steps
+PREFIX, SUFFIX = "market-", ".db.gz"
+CHUNK = 1 << 20
+
+class _Restarted(Exception):
+    """A write from another connection made SQLite restart the copy from page 1."""
+
+# --- COPY ---
+
+def _copy(dest_path):
+    """Writes a consistent snapshot of DB_PATH to dest_path, returns its page count.
+
+    Any write by another connection restarts a stepped backup, so a busy DB may
+    never let small steps finish. Each restart retries with bigger steps, and the
+    last attempt copies everything in one step: in WAL mode that is a single read
+    transaction, which still does not block writers.
+    """
+    for pages in (PAGES_PER_STEP, PAGES_PER_STEP * 16, -1):
+        source = sqlite3.connect(DB_PATH)
+        dest = sqlite3.connect(dest_path)
+        last = None
+
+        def progress(status, remaining, total):
+            nonlocal last
+            if last is not None and remaining > last:
+                raise _Restarted
+            last = remaining
+
+        try:
+            source.backup(dest, pages=pages, progress=progress, sleep=STEP_PAUSE)
+            # A standalone file: no -wal/-shm companions (the bot switches WAL back on when it opens it)
+            dest.execute("PRAGMA journal_mode=DELETE")
+            return dest.execute("PRAGMA page_count").fetchone()[0]
+        except _Restarted:
+            logger.info(f"Backup restarted by concurrent writes (step {pages} pages), retrying with bigger steps")
+        finally:
+            dest.close()
+            source.close()
+
+def _compress(src_path, gz_path):
+    with open(src_path, "rb") as f, gzip.open(gz_path, "wb", compresslevel=6) as out:
+        shutil.copyfileobj(f, out, CHUNK)
+
+def _decompress(gz_path, dest_path):
+    with gzip.open(gz_path, "rb") as f, open(dest_path, "wb") as out:
+        shutil.copyfileobj(f, out, CHUNK)
+
+def _integrity_check(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        result = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    finally:
+        conn.close()
+    if result != ["ok"]:
+        raise RuntimeError(f"integrity_check failed: {'; '.join(result[:5])}")
+
+def verify_backup(path):
+    """Decompresses a backup to a temp file and integrity-checks it; raises if it is unusable."""
+    fd, tmp = tempfile.mkstemp(suffix=".db", dir=os.path.dirname(path) or ".")
+    os.close(fd)
+    try:
+        _decompress(path, tmp)
+        _integrity_check(tmp)
+    finally:
+        os.remove(tmp)
+
+# --- BACKUPS ---
+
+def list_backups():
+    """Backup file names in BACKUP_DIR, newest first."""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    names = [n for n in os.listdir(BACKUP_DIR) if n.startswith(PREFIX) and n.endswith(SUFFIX)]
+    return sorted(names, reverse=True)  # the UTC timestamp in the name sorts chronologically
+
+def rotate(keep=BACKUP_KEEP):
+    """Deletes all but the `keep` newest backups, plus leftovers of interrupted runs."""
+    removed = list_backups()[keep:]
+    for name in removed:
+        os.remove(os.path.join(BACKUP_DIR, name))
+    for name in os.listdir(BACKUP_DIR):
+        path = os.path.join(BACKUP_DIR, name)
+        if name.endswith(".partial") and time.time() - os.path.getmtime(path) > 3600:
+            os.remove(path)
+    return removed
+
+def seconds_until_due(interval):
+    """How long until the next backup is due, judging by the newest one on disk."""
+    backups = list_backups()
+    if not backups:
+        return 0
+    age = time.time() - os.path.getmtime(os.path.join(BACKUP_DIR, backups[0]))
+    return max(0, interval - age)
+
+def backup_now():
+    """Takes, compresses, verifies and rotates one backup; returns its path.
+
+    Blocking (seconds for a large DB): the bot runs it via run_backup().
+    """
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    stamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(BACKUP_DIR, f"{PREFIX}{stamp}{SUFFIX}")
+    snapshot, partial = f"{path[:-3]}.partial", f"{path}.partial"
+    started = time.perf_counter()
+    try:
+        pages = _copy(snapshot)
+        _compress(snapshot, partial)
+        verify_backup(partial)  # check what is kept, not the intermediate copy
+        os.replace(partial, path)
+    finally:
+        for leftover in (snapshot, partial):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+
+    removed = rotate()
+    logger.info(f"Backup {os.path.basename(path)}: {pages} pages, {os.path.getsize(path) / 1e6:.1f} MB "
+                f"in {time.perf_counter() - started:.1f}s ({len(removed)} old backups rotated out)")
+    return path
+
+_running = asyncio.Lock()
+
+def backup_running():
+    return _running.locked()
+
+async def run_backup():
+    """backup_now() in a worker thread (not the DB thread: DB jobs keep flowing meanwhile)."""
+    async with _running:
+        try:
+            path = await asyncio.to_thread(backup_now)
+        except Exception:
+            metrics.BACKUP_FAILURES.inc()
+            raise
+    metrics.BACKUP_LAST_SUCCESS.set_to_current_time()
+    metrics.BACKUP_BYTES.set(os.path.getsize(path))
+    return path
+
+# --- RESTORE ---
+
+def _resolve(name):
+    return name if os.path.exists(name) else os.path.join(BACKUP_DIR, name)
+
+def restore(name, force=False):
+    """Replaces DB_PATH with a verified backup; returns where the replaced DB was kept (or None)."""
+    path = _resolve(name)
+    if os.path.exists(f"{DB_PATH}-wal") and not force:
+        raise RuntimeError(f"{DB_PATH}-wal exists: the bot is running (or crashed). Stop it first, or use --force.")
+
+    directory = os.path.dirname(DB_PATH) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix=".restore", dir=directory)
+    os.close(fd)
+    try:
+        _decompress(path, tmp)
+        _integrity_check(tmp)
+        kept = None
+        if os.path.exists(DB_PATH):
+            # Keep the DB being replaced (with its WAL) instead of deleting it
+            kept = f"{DB_PATH}.pre-restore-{datetime.datetime.now():%Y%m%d-%H%M%S}"
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(DB_PATH + suffix):
+                    os.replace(DB_PATH + suffix, kept + suffix)
+        os.replace(tmp, DB_PATH)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return kept
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(description="SQLite backups of the bot's database.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("now", help="take a backup now")
+    commands.add_parser("list", help="list backups, newest first")
+    commands.add_parser("verify", help="integrity-check a backup").add_argument("backup")
+    restore_parser = commands.add_parser("restore", help=f"replace {DB_PATH} with a backup (bot stopped)")
+    restore_parser.add_argument("backup")
+    restore_parser.add_argument("--force", action="store_true", help="restore even if a WAL file is present")
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+    try:
+        if args.command == "now":
+            print(backup_now())
+        elif args.command == "list":
+            for name in list_backups():
+                size = os.path.getsize(os.path.join(BACKUP_DIR, name))
+                print(f"{name}  {size / 1e6:.1f} MB")
+        elif args.command == "verify":
+            verify_backup(_resolve(args.backup))
+            print("OK")
+        else:
+            kept = restore(args.backup, args.force)
+            print(f"Restored {DB_PATH} from {args.backup}" + (f" (previous DB kept as {kept})" if kept else ""))
+    except (RuntimeError, OSError, sqlite3.Error, EOFError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
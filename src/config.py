@@ -1,4 +1,5 @@
 import os
+import re
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -6,8 +7,63 @@ load_dotenv()
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 ADMIN_GROUP_ID = os.getenv("ADMIN_GROUP_ID")
 CHANNEL_ID = os.getenv("CHANNEL_ID")
+# Public @username of the channel (without @), used to link search results to posts
+CHANNEL_USERNAME = os.getenv("CHANNEL_USERNAME", "dbumarketers")
 # Linux uses forward slashes /, but os.path.join handles it automatically
-DB_PATH = os.path.join("data", "market.db")
+DB_PATH = os.getenv("DB_PATH", os.path.join("data", "market.db"))
+
+# Runtime: "webhook" (one ASGI server, used on Fly) or "polling" (local runs).
+# Defaults to webhook whenever a public WEBHOOK_URL is configured. WEBHOOK_SECRET is required
+# there: Telegram echoes it in a header and any POST without it is refused.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+BOT_MODE = os.getenv("BOT_MODE") or ("webhook" if WEBHOOK_URL else "polling")
+PORT = int(os.getenv("PORT", "8080"))
+# Prometheus /metrics listens on its own port, outside the public http_service (Fly scrapes
+# it over the private network, see [metrics] in fly.toml). 0 turns the endpoint off.
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9091"))
+# Alternative Bot API server (a self-hosted one, or bench/fake_bot_api.py for load tests)
+BOT_API_URL = os.getenv("BOT_API_URL")
+
+# Updates processed in parallel (different users only; 1 = strictly one at a time)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", "16"))
+
+# User profile cache (see /stats for hit ratio when tuning)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "2048"))
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", "300"))  # seconds
+
+# Quotas (sliding window per user)
+POST_LIMIT = int(os.getenv("POST_LIMIT", "3"))
+POST_WINDOW_HOURS = int(os.getenv("POST_WINDOW_HOURS", "24"))
+FEEDBACK_LIMIT = int(os.getenv("FEEDBACK_LIMIT", "1"))
+FEEDBACK_WINDOW_HOURS = int(os.getenv("FEEDBACK_WINDOW_HOURS", "24"))
+
+# Listing expiry: APPROVED posts older than this are closed by a JobQueue sweep
+POST_EXPIRY_DAYS = int(os.getenv("POST_EXPIRY_DAYS", "30"))
+EXPIRY_SWEEP_MINUTES = int(os.getenv("EXPIRY_SWEEP_MINUTES", "15"))
+EXPIRY_BATCH_SIZE = int(os.getenv("EXPIRY_BATCH_SIZE", "50"))  # posts (channel edits) per sweep
+
+# Startup resume of APPROVED posts that never reached the channel (a restart mid /approve_all):
+# only posts approved this recently, and each gets at most RESUME_MAX_ATTEMPTS tries across boots
+RESUME_PUBLISH_HOURS = int(os.getenv("RESUME_PUBLISH_HOURS", "24"))
+RESUME_MAX_ATTEMPTS = int(os.getenv("RESUME_MAX_ATTEMPTS", "3"))
+
+# Hot/cold split: closed posts (SOLD/REJECTED/EXPIRED) and feedback older than this
+# move to posts_archive / feedback_archive in batches; get_post still finds them
+ARCHIVE_POSTS_AFTER_DAYS = int(os.getenv("ARCHIVE_POSTS_AFTER_DAYS", "90"))
+ARCHIVE_FEEDBACK_AFTER_DAYS = int(os.getenv("ARCHIVE_FEEDBACK_AFTER_DAYS", "180"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+
+# Online backups (src/backup.py). A Fly machine mounts a single volume, so by default
+# they sit next to the DB: that covers corruption and bad migrations, not losing the
+# volume. Point BACKUP_DIR at another mount where there is one; /backup sends a copy off the machine.
+BACKUP_DIR = os.getenv("BACKUP_DIR", os.path.join("data", "backups"))
+BACKUP_INTERVAL_HOURS = int(os.getenv("BACKUP_INTERVAL_HOURS", "24"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
 
 if not BOT_TOKEN:
-    raise ValueError("Missing BOT_TOKEN in .env file")
\ No newline at end of file
+    raise ValueError("Missing BOT_TOKEN in .env file")
+if BOT_MODE == "webhook" and not WEBHOOK_URL:
+    raise ValueError("BOT_MODE=webhook needs WEBHOOK_URL in .env file")
+if BOT_MODE == "webhook" and not re.fullmatch(r"[A-Za-z0-9_-]{16,256}", WEBHOOK_SECRET or ""):
+    raise ValueError("BOT_MODE=webhook needs WEBHOOK_SECRET (16-256 chars of A-Z, a-z, 0-9, _ and -) in .env file")
\ No newline at end of file
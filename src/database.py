@@ -1,208 +1,698 @@
 import sqlite3
+import asyncio
+import csv
 import logging
 import os  # <--- Added to handle folder creation
+import threading
+from contextlib import contextmanager
 from src.config import DB_PATH
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def get_connection():
-    """Establishes a connection to the database, ensuring the folder exists first."""
-    
+# --- CONNECTION MANAGER ---
+# One connection per process, opened lazily and tuned once. WAL lets readers
+# run while a write is in progress and NORMAL sync only fsyncs at checkpoints.
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-16000",      # ~16 MB page cache
+    "PRAGMA mmap_size=134217728",    # 128 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+)
+STATEMENT_CACHE_SIZE = 256
+
+_conn = None
+_conn_lock = threading.RLock()
+
+def _ensure_off_loop():
+    """Refuses to run SQLite on the event loop thread (use src.repository from handlers)."""
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    raise RuntimeError("Blocking SQLite call on the event loop thread; await src.repository instead.")
+
+def _open_connection():
     # --- FIX FOR RENDER: Create directory if it doesn't exist ---
     directory = os.path.dirname(DB_PATH)
-    if directory and not os.path.exists(directory):
-        os.makedirs(directory)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
     # -----------------------------------------------------------
 
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
     conn.row_factory = sqlite3.Row
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
     return conn
 
+def get_connection():
+    """Returns the shared connection, opening and tuning it on first use."""
+    global _conn
+    _ensure_off_loop()
+    with _conn_lock:
+        if _conn is None:
+            _conn = _open_connection()
+        return _conn
+
+def close_connection():
+    """Closes the shared connection; the next call reopens it."""
+    global _conn
+    with _conn_lock:
+        if _conn is not None:
+            try:
+                _conn.close()
+            except sqlite3.Error:
+                pass
+            _conn = None
+
+@contextmanager
+def db_session():
+    """Yields the shared connection as one transaction.
+
+    Commits on success and rolls back on error. If SQLite itself failed (anything but
+    a constraint violation) the connection is dropped so the next call starts clean.
+    """
+    with _conn_lock:
+        conn = get_connection()
+        try:
+            yield conn
+            conn.commit()
+        except Exception as e:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+            if isinstance(e, sqlite3.DatabaseError) and not isinstance(e, sqlite3.IntegrityError):
+                logger.warning(f"SQLite error, reopening connection: {e}")
+                close_connection()
+            raise
+
+# posts columns carried into posts_archive (same names and order as the hot table)
+ARCHIVED_POST_COLUMNS = (
+    ("post_id", "INTEGER"), ("user_id", "INTEGER NOT NULL"), ("type", "TEXT NOT NULL"), ("category", "TEXT"),
+    ("condition", "TEXT"), ("content", "TEXT"), ("title", "TEXT"), ("location", "TEXT"), ("description", "TEXT"),
+    ("photo_id", "TEXT"), ("hidden_detail", "TEXT"), ("price", "TEXT"), ("status", "TEXT"),
+    ("message_id", "INTEGER"), ("created_at", "DATETIME"), ("published_at", "DATETIME"),
+)
+POST_COLUMN_LIST = ", ".join(column for column, _ in ARCHIVED_POST_COLUMNS)
+
+# Bump whenever init_db's DDL changes: databases already at this version skip it entirely
+SCHEMA_VERSION = 7
+
 def init_db():
-    conn = get_connection()
-    c = conn.cursor()
-
-    # 1. USERS TABLE (Added 'location')
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        user_id INTEGER PRIMARY KEY,
-        username TEXT,
-        is_seller BOOLEAN DEFAULT 0,
-        real_name TEXT,
-        phone_number TEXT,
-        id_number TEXT,
-        location TEXT,                -- New: Main, Health, Mehal Meda, Outside
-        joined_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        is_blocked BOOLEAN DEFAULT 0
-    )
-    ''')
-
-    # 2. POSTS TABLE (Added 'condition')
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS posts (
-        post_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        type TEXT NOT NULL,
-        category TEXT,
-        condition TEXT,               -- New: New / Used
-        content TEXT,
-        photo_id TEXT,
-        hidden_detail TEXT,
-        price TEXT,
-        status TEXT DEFAULT 'PENDING',
-        message_id INTEGER,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-        FOREIGN KEY(user_id) REFERENCES users(user_id)
-    )
-    ''')
+    """Creates/migrates the schema, unless PRAGMA user_version says it is already current."""
+    with db_session() as conn:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == SCHEMA_VERSION:
+            logger.info(f"Database schema v{SCHEMA_VERSION} is current")
+            return
+        c = conn.cursor()
+
+        # 1. USERS TABLE (Added 'location')
+        c.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            is_seller BOOLEAN DEFAULT 0,
+            real_name TEXT,
+            phone_number TEXT,
+            id_number TEXT,
+            location TEXT,                -- New: Main, Health, Mehal Meda, Outside
+            joined_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            is_blocked BOOLEAN DEFAULT 0
+        )
+        ''')
+
+        # 2. POSTS TABLE (Added 'condition')
+        c.execute('''
+        CREATE TABLE IF NOT EXISTS posts (
+            post_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            category TEXT,
+            condition TEXT,               -- New: New / Used
+            content TEXT,                 -- Legacy blob (title/Location:/desc), kept for search & exports
+            title TEXT,                   -- v3: structured fields, see backfill_post_fields()
+            location TEXT,
+            description TEXT,
+            photo_id TEXT,
+            hidden_detail TEXT,
+            price TEXT,
+            status TEXT DEFAULT 'PENDING',
+            message_id INTEGER,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,   -- submitted (what the posting quota counts)
+            published_at DATETIME,        -- v5: went live (approved or renewed), the expiry clock
+            FOREIGN KEY(user_id) REFERENCES users(user_id)
+        )
+        ''')
     
-    # 3. INTERACTIONS (No changes)
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS interactions (
-        interaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
-        buyer_id INTEGER NOT NULL,
-        seller_id INTEGER NOT NULL,
-        post_id INTEGER NOT NULL,
-        status TEXT DEFAULT 'PENDING',
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-
-    # 4. BLACKLIST TABLE (New: Permanent Bans)
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS blacklist (
-        user_id INTEGER PRIMARY KEY,
-        banned_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-
-    # 5. FEEDBACK TABLE (New: Rate Limiting)
-    c.execute('''
-    CREATE TABLE IF NOT EXISTS feedback (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        user_id INTEGER NOT NULL,
-        content TEXT,
-        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-    )
-    ''')
-
-    conn.commit()
-    conn.close()
-    logger.info("Database initialized with v2 Schema (Blacklist & Feedback added)")
+        # 3. INTERACTIONS (No changes)
+        c.execute('''
+        CREATE TABLE IF NOT EXISTS interactions (
+            interaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            buyer_id INTEGER NOT NULL,
+            seller_id INTEGER NOT NULL,
+            post_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'PENDING',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        # 4. BLACKLIST TABLE (New: Permanent Bans)
+        c.execute('''
+        CREATE TABLE IF NOT EXISTS blacklist (
+            user_id INTEGER PRIMARY KEY,
+            banned_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        # 5. FEEDBACK TABLE (New: Rate Limiting)
+        c.execute('''
+        CREATE TABLE IF NOT EXISTS feedback (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            content TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        # 6. PERSISTENCE (Conversation states, user_data & bot_data survive restarts)
+        c.execute('''
+        CREATE TABLE IF NOT EXISTS persistence (
+            kind TEXT NOT NULL,           -- 'user', 'bot' or 'conv:<handler name>'
+            key TEXT NOT NULL,
+            data TEXT NOT NULL,           -- JSON
+            PRIMARY KEY (kind, key)
+        ) WITHOUT ROWID
+        ''')
+
+        # 7. INDEXES (Hot paths: per-user lookups, rate limiter rebuild & status sweeps)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_posts_user_created ON posts(user_id, created_at)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_posts_status_created ON posts(status, created_at)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_posts_created ON posts(created_at)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_feedback_user_created ON feedback(user_id, created_at)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_feedback_created ON feedback(created_at)")
+
+        # 8. SEARCH INDEX (FTS5 over APPROVED posts only, rowid = post_id)
+        fts_exists = c.execute("SELECT 1 FROM sqlite_master WHERE name = 'posts_fts'").fetchone()
+        c.execute("CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(body, category, tokenize='unicode61 remove_diacritics 2')")
+        if not fts_exists:
+            c.execute("INSERT INTO posts_fts (rowid, body, category) SELECT post_id, content, category FROM posts WHERE status = 'APPROVED'")
+
+        # 9. STRUCTURED POST FIELDS (v3: old databases get the columns here, rows are
+        #    filled in the background by backfill_post_fields while the bot keeps serving)
+        columns = {row['name'] for row in c.execute("PRAGMA table_info(posts)")}
+        for column in ("title", "location", "description"):
+            if column not in columns:
+                c.execute(f"ALTER TABLE posts ADD COLUMN {column} TEXT")
+        # Partial index = exactly the rows still waiting for the backfill (empty once done)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_posts_unmigrated ON posts(post_id) WHERE title IS NULL")
+
+        # 10. ARCHIVE (v4: closed posts and old feedback move here, see archive_closed_posts;
+        #     post_id / id keep their hot values, AUTOINCREMENT never hands them out again)
+        c.execute(f'''
+        CREATE TABLE IF NOT EXISTS posts_archive (
+            post_id INTEGER PRIMARY KEY,
+            {", ".join(f"{column} {kind}" for column, kind in ARCHIVED_POST_COLUMNS[1:])},
+            archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        c.execute("CREATE INDEX IF NOT EXISTS idx_posts_archive_user ON posts_archive(user_id)")
+        c.execute('''
+        CREATE TABLE IF NOT EXISTS feedback_archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            content TEXT,
+            created_at DATETIME,
+            archived_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        # 11. PUBLISH TIME (v5: expiry and renewals use published_at, so renewing a listing
+        #     no longer moves created_at, which the posting quota counts)
+        for table in ("posts", "posts_archive"):
+            columns = {row['name'] for row in c.execute(f"PRAGMA table_info({table})")}
+            if "published_at" not in columns:
+                c.execute(f"ALTER TABLE {table} ADD COLUMN published_at DATETIME")
+                c.execute(f"UPDATE {table} SET published_at = created_at WHERE status != 'PENDING'")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_posts_status_published ON posts(status, published_at)")
+
+        # 12. UNPUBLISHED (v6: approved posts that never reached the channel, e.g. a restart
+        #     in the middle of /approve_all; see get_unpublished_posts)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_posts_unpublished ON posts(post_id) "
+                  "WHERE status = 'APPROVED' AND message_id IS NULL")
+
+        # 13. PUBLISH ATTEMPTS (v7: startup resumes that failed, so a post that can never be
+        #     published stops being retried; hot table only, see record_publish_failure)
+        columns = {row['name'] for row in c.execute("PRAGMA table_info(posts)")}
+        if "publish_attempts" not in columns:
+            c.execute("ALTER TABLE posts ADD COLUMN publish_attempts INTEGER NOT NULL DEFAULT 0")
+
+        c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    logger.info(f"Database initialized with v{SCHEMA_VERSION} Schema (publish attempts)")
 
 # --- Helper Methods ---
 
+class UserRecord:
+    """Compact read-only copy of a users row. Supports user['field'] like sqlite3.Row."""
+    __slots__ = ('user_id', 'username', 'is_seller', 'real_name', 'phone_number',
+                 'id_number', 'location', 'joined_at', 'is_blocked')
+
+    def __init__(self, row):
+        for name in self.__slots__:
+            object.__setattr__(self, name, row[name])
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("UserRecord is read-only (it may be shared through the cache)")
+
+    def __repr__(self):
+        return f"UserRecord(user_id={self.user_id}, real_name={self.real_name!r})"
+
 def get_user(user_id):
-    conn = get_connection()
-    user = conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)).fetchone()
-    conn.close()
-    return user
+    with db_session() as conn:
+        row = conn.execute("SELECT * FROM users WHERE user_id = ?", (user_id,)).fetchone()
+    return UserRecord(row) if row else None
 
 def register_seller(user_id, username, real_name, phone_number, id_number, location):
-    conn = get_connection()
-    conn.execute('''
-        INSERT OR REPLACE INTO users (user_id, username, is_seller, real_name, phone_number, id_number, location)
-        VALUES (?, ?, 1, ?, ?, ?, ?)
-    ''', (user_id, username, real_name, phone_number, id_number, location))
-    conn.commit()
-    conn.close()
-
-def create_post(user_id, type, category, condition, content, price, photo_id):
-    conn = get_connection()
-    c = conn.cursor()
-    c.execute('''
-        INSERT INTO posts (user_id, type, category, condition, content, price, photo_id, status)
-        VALUES (?, ?, ?, ?, ?, ?, ?, 'PENDING')
-    ''', (user_id, type, category, condition, content, price, photo_id))
-    post_id = c.lastrowid
-    conn.commit()
-    conn.close()
-    return post_id
-
-# New: Admin Tool
-def get_all_users():
-    conn = get_connection()
-    users = conn.execute("SELECT * FROM users").fetchall()
-    conn.close()
-    return users
-
-def update_post_status(post_id, status):
-    """Updates the status of a post (APPROVED, REJECTED, SOLD)."""
-    conn = get_connection()
-    conn.execute('UPDATE posts SET status = ? WHERE post_id = ?', (status, post_id))
-    conn.commit()
-    conn.close()
+    with db_session() as conn:
+        conn.execute('''
+            INSERT OR REPLACE INTO users (user_id, username, is_seller, real_name, phone_number, id_number, location)
+            VALUES (?, ?, 1, ?, ?, ?, ?)
+        ''', (user_id, username, real_name, phone_number, id_number, location))
+
+def create_post(user_id, type, category, condition, title, location, description, price, photo_id):
+    # The legacy blob is still written so full-text search and CSV exports keep their shape
+    if type in ('LOST', 'FOUND'):
+        content = f"{title}\nLocation: {location}\n{description}"
+    else:
+        content = f"{title}\n{description}"
+    with db_session() as conn:
+        c = conn.execute('''
+            INSERT INTO posts (user_id, type, category, condition, content, title, location, description,
+                               price, photo_id, status)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'PENDING')
+        ''', (user_id, type, category, condition, content, title, location, description, price, photo_id))
+        return c.lastrowid
+
+def _sync_search_index(conn, post_id, status):
+    """Keeps posts_fts in step with a status change: only APPROVED posts are searchable."""
+    conn.execute("DELETE FROM posts_fts WHERE rowid = ?", (post_id,))
+    if status == 'APPROVED':
+        conn.execute("INSERT INTO posts_fts (rowid, body, category) SELECT post_id, content, category FROM posts WHERE post_id = ?",
+                     (post_id,))
+
+# --- POST STATE MACHINE ---
+# Every status change goes through a conditional UPDATE, so of two racing callers
+# (two admins, a double tap, a bulk command) exactly one wins.
+POST_TRANSITIONS = {
+    'PENDING': {'APPROVED', 'REJECTED'},
+    'APPROVED': {'SOLD', 'EXPIRED'},
+    'EXPIRED': {'APPROVED'},          # renew (see renew_post)
+}
+
+def _check_transition(from_status, to_status):
+    if to_status not in POST_TRANSITIONS.get(from_status, ()):
+        raise ValueError(f"Illegal post transition {from_status} -> {to_status}")
+
+def _status_update_sql(to_status, extra=""):
+    """UPDATE for a compare-and-set status change; going live restarts the expiry clock."""
+    published = ", published_at = CURRENT_TIMESTAMP" if to_status == 'APPROVED' else ""
+    return f"UPDATE posts SET status = ?{published}{extra} WHERE post_id = ? AND status = ?"
+
+def transition_post(post_id, from_status, to_status):
+    """Compare-and-set status change. True only for the caller that actually moved the post."""
+    _check_transition(from_status, to_status)
+    with db_session() as conn:
+        c = conn.execute(_status_update_sql(to_status), (to_status, post_id, from_status))
+        if not c.rowcount:
+            return False
+        _sync_search_index(conn, post_id, to_status)
+    return True
 
 def update_post_message_id(post_id, message_id):
     """Links the database post to the actual Telegram Channel message."""
-    conn = get_connection()
-    conn.execute('UPDATE posts SET message_id = ? WHERE post_id = ?', (message_id, post_id))
-    conn.commit()
-    conn.close()
+    with db_session() as conn:
+        conn.execute('UPDATE posts SET message_id = ? WHERE post_id = ?', (message_id, post_id))
+
+def _post_fields(conn, row):
+    """Row -> dict with title/location/description always set.
+
+    Rows the backfill hasn't reached yet are split from the legacy blob on the fly.
+    """
+    post = dict(row)
+    if post['title'] is None:
+        seller_location = None
+        if post['type'] == 'SELL':
+            seller = conn.execute("SELECT location FROM users WHERE user_id = ?", (post['user_id'],)).fetchone()
+            seller_location = seller['location'] if seller else None
+        post['title'], post['location'], post['description'] = parse_post_content(post, seller_location)
+    return post
 
 def get_post(post_id):
-    """Fetch a single post (for admin review)."""
-    conn = get_connection()
-    post = conn.execute("SELECT * FROM posts WHERE post_id = ?", (post_id,)).fetchone()
-    conn.close()
+    """Fetch a single post, archived ones included (post['archived'] tells them apart)."""
+    with db_session() as conn:
+        row = conn.execute("SELECT * FROM posts WHERE post_id = ?", (post_id,)).fetchone()
+        archived = row is None
+        if archived:
+            row = conn.execute("SELECT * FROM posts_archive WHERE post_id = ?", (post_id,)).fetchone()
+        if row is None:
+            return None
+        post = _post_fields(conn, row)
+    post['archived'] = archived
     return post
 
+def count_pending_posts():
+    with db_session() as conn:
+        return conn.execute("SELECT COUNT(*) FROM posts WHERE status = 'PENDING'").fetchone()[0]
+
+def get_pending_posts(limit=500):
+    """Oldest-first queue of posts waiting for moderation."""
+    with db_session() as conn:
+        rows = conn.execute(
+            "SELECT * FROM posts WHERE status = 'PENDING' ORDER BY created_at LIMIT ?", (limit,)
+        ).fetchall()
+        return [_post_fields(conn, row) for row in rows]
+
+def bulk_update_status(post_ids, from_status, to_status):
+    """Moves many posts from one status to another in a single transaction.
+
+    Only rows still in `from_status` change; returns the IDs that actually moved.
+    """
+    _check_transition(from_status, to_status)
+    changed = []
+    sql = _status_update_sql(to_status)
+    with db_session() as conn:
+        for post_id in post_ids:
+            c = conn.execute(sql, (to_status, post_id, from_status))
+            if c.rowcount:
+                changed.append(post_id)
+                _sync_search_index(conn, post_id, to_status)
+    return changed
+
+def renew_post(post_id):
+    """EXPIRED -> APPROVED with a fresh published_at, so the next sweep starts the clock again.
+
+    created_at stays the submission time (a renewal is not a new post for the quota).
+    An expired post that was archived meanwhile is moved back to the hot table first.
+    The old (closed) channel message is unlinked: until the new one is sent the post
+    counts as unpublished, so a failed republish is picked up by resume_publishing.
+    """
+    _check_transition('EXPIRED', 'APPROVED')
+    with db_session() as conn:
+        _unarchive_post(conn, post_id, 'EXPIRED')
+        c = conn.execute(_status_update_sql('APPROVED', ", message_id = NULL, publish_attempts = 0"),
+                         ('APPROVED', post_id, 'EXPIRED'))
+        if not c.rowcount:
+            return False
+        _sync_search_index(conn, post_id, 'APPROVED')
+    return True
+
+def get_expired_posts(max_age_seconds, limit=50):
+    """Oldest APPROVED posts published more than `max_age_seconds` ago (walks idx_posts_status_published)."""
+    with db_session() as conn:
+        rows = conn.execute(
+            "SELECT * FROM posts WHERE status = 'APPROVED' AND published_at < datetime('now', ?) "
+            "ORDER BY published_at LIMIT ?", (f"-{int(max_age_seconds)} seconds", limit)
+        ).fetchall()
+        return [_post_fields(conn, row) for row in rows]
+
+def get_unpublished_posts(max_age_seconds, max_attempts, limit=500):
+    """APPROVED posts without a channel message, approved within `max_age_seconds` and
+    tried fewer than `max_attempts` times (walks idx_posts_unpublished, empty in steady state).
+
+    INDEXED BY: left alone the planner prefers idx_posts_status_published and sorts every
+    APPROVED row (~70 ms at 100k posts, on the DB thread every handler shares).
+    """
+    with db_session() as conn:
+        rows = conn.execute(
+            "SELECT * FROM posts INDEXED BY idx_posts_unpublished "
+            "WHERE status = 'APPROVED' AND message_id IS NULL "
+            "AND published_at >= datetime('now', ?) AND publish_attempts < ? ORDER BY post_id LIMIT ?",
+            (f"-{int(max_age_seconds)} seconds", max_attempts, limit)
+        ).fetchall()
+        return [_post_fields(conn, row) for row in rows]
+
+def record_publish_failure(post_id):
+    """Counts a failed resume of an unpublished post; returns its attempts so far."""
+    with db_session() as conn:
+        row = conn.execute("UPDATE posts SET publish_attempts = publish_attempts + 1 WHERE post_id = ? "
+                           "RETURNING publish_attempts", (post_id,)).fetchone()
+    return row[0] if row else 0
+
+def get_open_lost_found_posts():
+    """APPROVED LOST/FOUND posts (the matching engine's working set)."""
+    with db_session() as conn:
+        rows = conn.execute(
+            "SELECT post_id, type, user_id, content, title, location, description, message_id FROM posts "
+            "WHERE status = 'APPROVED' AND type IN ('LOST', 'FOUND')"
+        ).fetchall()
+        return [_post_fields(conn, row) for row in rows]
+
+def parse_post_content(post, fallback_location):
+    """Splits the legacy content blob into (title, location, description)."""
+    lines = (post['content'] or "").splitlines() or [""]
+    title = lines[0]
+    location_text = fallback_location
+    desc_start_index = 1
+    if len(lines) > 1 and lines[1].startswith("Location: "):
+        location_text = lines[1].replace("Location: ", "")
+        desc_start_index = 2
+    desc = "\n".join(lines[desc_start_index:]) if len(lines) > desc_start_index else ""
+    return title, location_text, desc
+
+def backfill_post_fields(batch_size=500):
+    """Moves one batch of legacy rows onto the structured columns.
+
+    Returns how many rows were filled; 0 means the backfill is finished.
+    """
+    with db_session() as conn:
+        rows = conn.execute('''
+            SELECT p.post_id, p.type, p.content, u.location AS seller_location
+            FROM posts p LEFT JOIN users u ON u.user_id = p.user_id
+            WHERE p.title IS NULL
+            ORDER BY p.post_id LIMIT ?
+        ''', (batch_size,)).fetchall()
+        updates = [
+            (*parse_post_content(row, row['seller_location'] if row['type'] == 'SELL' else None), row['post_id'])
+            for row in rows
+        ]
+        conn.executemany("UPDATE posts SET title = ?, location = ?, description = ? WHERE post_id = ?", updates)
+    return len(updates)
+
+# --- ARCHIVE ---
+# Closed posts and old feedback leave the hot tables in small batches, one short
+# transaction each (see repository.archive_old_rows), so live queries, the expiry
+# sweep and the match index warm-up only ever walk the working set.
+ARCHIVED_STATUSES = ('SOLD', 'REJECTED', 'EXPIRED')
+
+def _move_rows(conn, source, target, columns, key, ids):
+    marks = ", ".join("?" * len(ids))
+    conn.execute(f"INSERT OR REPLACE INTO {target} ({columns}) SELECT {columns} FROM {source} WHERE {key} IN ({marks})", ids)
+    conn.execute(f"DELETE FROM {source} WHERE {key} IN ({marks})", ids)
+
+def archive_closed_posts(older_than_days, batch_size=500):
+    """Moves one batch of SOLD/REJECTED/EXPIRED posts created more than `older_than_days` ago.
+
+    Returns how many posts moved; 0 means nothing is left to archive. Closed posts
+    are never in posts_fts, so the search index needs no update.
+    """
+    with db_session() as conn:
+        ids = [row[0] for row in conn.execute(
+            f"SELECT post_id FROM posts WHERE status IN ({', '.join('?' * len(ARCHIVED_STATUSES))}) "
+            "AND created_at < datetime('now', ?) LIMIT ?",
+            (*ARCHIVED_STATUSES, f"-{int(older_than_days)} days", batch_size))]
+        if ids:
+            _move_rows(conn, "posts", "posts_archive", POST_COLUMN_LIST, "post_id", ids)
+    return len(ids)
+
+def archive_old_feedback(older_than_days, batch_size=500):
+    """Moves one batch of feedback older than `older_than_days`; returns how many rows moved."""
+    with db_session() as conn:
+        ids = [row[0] for row in conn.execute(
+            "SELECT id FROM feedback WHERE created_at < datetime('now', ?) LIMIT ?",
+            (f"-{int(older_than_days)} days", batch_size))]
+        if ids:
+            _move_rows(conn, "feedback", "feedback_archive", "id, user_id, content, created_at", "id", ids)
+    return len(ids)
+
+def _unarchive_post(conn, post_id, status):
+    """Moves an archived post in `status` back to the hot table (no-op if it is not archived)."""
+    c = conn.execute(f"INSERT INTO posts ({POST_COLUMN_LIST}) SELECT {POST_COLUMN_LIST} FROM posts_archive "
+                     "WHERE post_id = ? AND status = ?", (post_id, status))
+    if c.rowcount:
+        conn.execute("DELETE FROM posts_archive WHERE post_id = ?", (post_id,))
+
+# --- SEARCH ---
+def search_posts(match, category=None, condition=None, min_price=None, max_price=None,
+                 after=None, limit=10):
+    """Ranked full-text search over approved posts (best first).
+
+    `match` is an FTS5 query. `after` is the (score, post_id) of the last row of the
+    previous page (keyset pagination). Returns rows with a `score` column.
+    """
+    query = '''
+        SELECT p.post_id, p.type, p.user_id, p.category, p.condition, p.price, p.content, p.title,
+               p.location, p.description, p.message_id, bm25(posts_fts) AS score
+        FROM posts_fts JOIN posts p ON p.post_id = posts_fts.rowid
+        WHERE posts_fts MATCH ?
+    '''
+    params = [match]
+    if category:
+        query += " AND p.category LIKE ?"
+        params.append(f"%{category}%")
+    if condition:
+        query += " AND p.condition LIKE ?"
+        params.append(f"%{condition}%")
+    if min_price is not None or max_price is not None:
+        query += " AND p.price GLOB '[0-9]*' AND CAST(p.price AS INTEGER) BETWEEN ? AND ?"
+        params += [min_price if min_price is not None else 0, max_price if max_price is not None else 2**62]
+    if after is not None:
+        query += " AND (bm25(posts_fts), p.post_id) > (?, ?)"
+        params += list(after)
+    query += " ORDER BY score, p.post_id LIMIT ?"
+    params.append(limit)
+    with db_session() as conn:
+        return [_post_fields(conn, row) for row in conn.execute(query, params).fetchall()]
+
 # --- SAFETY & ADMIN TOOLS ---
 
-def count_recent_posts(user_id):
-    """Returns the number of posts a user made in the last 24 hours."""
-    conn = get_connection()
-    # SQLite syntax to get records from now minus 1 day
+def get_post_times_since(seconds):
+    """(user_id, unix_time) of every post created in the last `seconds` (rate limiter rebuild)."""
     query = '''
-        SELECT COUNT(*) as count 
-        FROM posts 
-        WHERE user_id = ? 
-        AND created_at >= datetime('now', '-1 day')
+        SELECT user_id, CAST(strftime('%s', created_at) AS INTEGER) AS ts
+        FROM posts
+        WHERE created_at >= datetime('now', ?)
     '''
-    result = conn.execute(query, (user_id,)).fetchone()
-    conn.close()
-    return result['count'] if result else 0
+    with db_session() as conn:
+        rows = conn.execute(query, (f"-{int(seconds)} seconds",)).fetchall()
+    return [(row['user_id'], row['ts']) for row in rows]
+
+def get_user_channel_posts(user_id):
+    """post_id, message_id, photo_id of every channel post by `user_id`, archived ones included."""
+    with db_session() as conn:
+        rows = conn.execute('''
+            SELECT post_id, message_id, photo_id FROM posts WHERE user_id = ? AND message_id IS NOT NULL
+            UNION ALL
+            SELECT post_id, message_id, photo_id FROM posts_archive WHERE user_id = ? AND message_id IS NOT NULL
+            ORDER BY post_id
+        ''', (user_id, user_id)).fetchall()
+    return [dict(row) for row in rows]
 
 def delete_user_data(user_id):
     """Soft Delete: Removes user and posts, but DOES NOT ban them."""
-    conn = get_connection()
-    # 1. Delete Posts
-    conn.execute("DELETE FROM posts WHERE user_id = ?", (user_id,))
-    # 2. Delete User
-    conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
-    conn.commit()
-    conn.close()
+    with db_session() as conn:
+        # 1. Delete Posts (and their search entries)
+        conn.execute("DELETE FROM posts_fts WHERE rowid IN (SELECT post_id FROM posts WHERE user_id = ?)", (user_id,))
+        conn.execute("DELETE FROM posts WHERE user_id = ?", (user_id,))
+        conn.execute("DELETE FROM posts_archive WHERE user_id = ?", (user_id,))
+        # 2. Delete User
+        conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
 
 # --- NEW: BLACKLIST FUNCTIONS ---
+# The banned list is tiny and only changes through /ban, so it is kept in memory:
+# loaded once at startup and written through by add_to_blacklist.
+_blacklist = set()
+
+def load_blacklist():
+    """Loads every banned ID into memory (call once at startup)."""
+    global _blacklist
+    with db_session() as conn:
+        rows = conn.execute("SELECT user_id FROM blacklist").fetchall()
+    _blacklist = {row['user_id'] for row in rows}
+    logger.info(f"Blacklist loaded: {len(_blacklist)} banned users")
+
 def add_to_blacklist(user_id):
     """Permanently bans a user ID."""
-    conn = get_connection()
-    conn.execute("INSERT OR IGNORE INTO blacklist (user_id) VALUES (?)", (user_id,))
-    conn.commit()
-    conn.close()
+    with db_session() as conn:
+        conn.execute("INSERT OR IGNORE INTO blacklist (user_id) VALUES (?)", (user_id,))
+    _blacklist.add(user_id)
 
 def is_blacklisted(user_id):
-    """Checks if a user is banned."""
-    conn = get_connection()
-    res = conn.execute("SELECT 1 FROM blacklist WHERE user_id = ?", (user_id,)).fetchone()
-    conn.close()
-    return res is not None
+    """Checks if a user is banned (memory only, safe to call on the event loop)."""
+    return user_id in _blacklist
 
 # --- NEW: FEEDBACK FUNCTIONS ---
 def log_feedback(user_id, content):
-    conn = get_connection()
-    conn.execute("INSERT INTO feedback (user_id, content) VALUES (?, ?)", (user_id, content))
-    conn.commit()
-    conn.close()
-
-def count_recent_feedback(user_id):
-    """Returns number of feedback messages sent in last 24 hours."""
-    conn = get_connection()
-    query = "SELECT COUNT(*) as count FROM feedback WHERE user_id = ? AND created_at >= datetime('now', '-1 day')"
-    result = conn.execute(query, (user_id,)).fetchone()
-    conn.close()
-    return result['count'] if result else 0
+    with db_session() as conn:
+        conn.execute("INSERT INTO feedback (user_id, content) VALUES (?, ?)", (user_id, content))
+
+def get_feedback_times_since(seconds):
+    """(user_id, unix_time) of every feedback sent in the last `seconds` (rate limiter rebuild)."""
+    query = '''
+        SELECT user_id, CAST(strftime('%s', created_at) AS INTEGER) AS ts
+        FROM feedback
+        WHERE created_at >= datetime('now', ?)
+    '''
+    with db_session() as conn:
+        rows = conn.execute(query, (f"-{int(seconds)} seconds",)).fetchall()
+    return [(row['user_id'], row['ts']) for row in rows]
+
+# --- ADMIN LISTINGS & EXPORT ---
+def count_users():
+    with db_session() as conn:
+        return conn.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+def get_users_page(after_id=None, before_id=None, limit=20):
+    """Keyset page of users ordered by user_id.
+
+    Returns (rows, has_more): has_more says whether another page exists in the
+    direction we moved (after_id = forward, before_id = backward).
+    """
+    with db_session() as conn:
+        if before_id is not None:
+            rows = conn.execute(
+                "SELECT user_id, real_name, phone_number FROM users WHERE user_id < ? ORDER BY user_id DESC LIMIT ?",
+                (before_id, limit + 1)).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT user_id, real_name, phone_number FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?",
+                (after_id if after_id is not None else -1, limit + 1)).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if before_id is not None:
+        rows.reverse()
+    return rows, has_more
+
+# Exportable tables and their keyset column
+EXPORT_TABLES = {"users": "user_id", "posts": "post_id", "posts_archive": "post_id"}
+
+def export_csv_chunk(table, path, after_key=None, chunk_size=1000):
+    """Appends the next `chunk_size` rows of `table` to the CSV at `path` (header on the first chunk).
+
+    Returns (last_key, rows_written); last_key is None once the table is exhausted.
+    Rows are pulled with fetchmany so memory stays flat whatever the table size.
+    """
+    key = EXPORT_TABLES[table]
+    query = f"SELECT * FROM {table} WHERE {key} > ? ORDER BY {key} LIMIT ?"
+    written, last_key = 0, None
+    with db_session() as conn, open(path, "a", newline="", encoding="utf-8") as f:
+        cursor = conn.execute(query, (after_key if after_key is not None else -1, chunk_size))
+        writer = csv.writer(f)
+        if after_key is None:
+            writer.writerow([col[0] for col in cursor.description])
+        while rows := cursor.fetchmany(200):
+            writer.writerows(rows)
+            written += len(rows)
+            last_key = rows[-1][key]
+    return (last_key if written == chunk_size else None), written
+
+# --- CONVERSATION PERSISTENCE ---
+def load_persistence():
+    """Every stored (kind, key, data) row, loaded in one pass at startup."""
+    with db_session() as conn:
+        return [tuple(row) for row in conn.execute("SELECT kind, key, data FROM persistence")]
+
+def save_persistence(upserts, deletes):
+    """Writes a batch of (kind, key, data) rows and removes (kind, key) rows in one transaction."""
+    with db_session() as conn:
+        conn.executemany("INSERT OR REPLACE INTO persistence (kind, key, data) VALUES (?, ?, ?)", upserts)
+        conn.executemany("DELETE FROM persistence WHERE kind = ? AND key = ?", deletes)
 
 if __name__ == "__main__":
-    init_db()
\ No newline at end of file
+    init_db()
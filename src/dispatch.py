@@ -0,0 +1,90 @@
+"""Concurrent update processing that keeps each user's updates in order.
+
+PTB processes one update at a time by default, so a slow send_photo to the
+admin group in one student's flow delays everybody else's button press.
+PerUserUpdateProcessor runs updates from different users in parallel (up to
+CONCURRENT_UPDATES) while every user's updates still run strictly one after
+another, which is what the ConversationHandler state machines rely on.
+"""
+import asyncio
+import contextlib
+import time
+import weakref
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+from src import metrics
+
+# PTB's own semaphore (taken before ours) only caps the backlog; the real limit is `limit`
+BACKLOG_LIMIT = 4096
+
+def ordering_key(update):
+    """Updates with the same key never overlap: the user, else the chat (channel posts)."""
+    if isinstance(update, Update):
+        if update.effective_user:
+            return update.effective_user.id
+        if update.effective_chat:
+            return update.effective_chat.id
+    return None
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Up to `limit` updates at once, but one at a time per user.
+
+    The per-user lock is taken before a slot, so a user with a backlog of
+    updates never sits on slots other users could use. asyncio.Lock wakes
+    waiters in FIFO order and the Application starts one task per update in
+    arrival order, so a user's updates run in the order Telegram sent them.
+    """
+
+    def __init__(self, limit):
+        super().__init__(max(BACKLOG_LIMIT, limit))
+        self.limit = limit
+        self.waiting = 0
+        self.running = 0
+        self.processed = 0
+        self.total_wait = 0.0
+        self._slots = asyncio.Semaphore(limit)
+        self._user_locks = weakref.WeakValueDictionary()
+        metrics.UPDATES_WAITING.set_function(lambda: self.waiting)
+        metrics.UPDATES_RUNNING.set_function(lambda: self.running)
+
+    def _lock_for(self, key):
+        if key is None:
+            return contextlib.nullcontext()
+        lock = self._user_locks.get(key)
+        if lock is None:
+            lock = self._user_locks[key] = asyncio.Lock()
+        return lock
+
+    async def do_process_update(self, update, coroutine):
+        queued = time.perf_counter()
+        started = None
+        self.waiting += 1
+        try:
+            async with self._lock_for(ordering_key(update)), self._slots:
+                started = time.perf_counter()
+                self.waiting -= 1
+                self.running += 1
+                self.total_wait += started - queued
+                metrics.UPDATE_WAIT.observe(started - queued)
+                await coroutine
+        finally:
+            if started is None:
+                self.waiting -= 1
+            else:
+                self.running -= 1
+                self.processed += 1
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "running": self.running,
+            "waiting": self.waiting,
+            "processed": self.processed,
+            "avg_wait_ms": self.total_wait / self.processed * 1000 if self.processed else 0.0,
+        }
@@ -1,16 +1,226 @@
+import asyncio
+import collections
+import time
+import weakref
 from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
 from telegram.ext import ContextTypes, CallbackQueryHandler
-from telegram.error import BadRequest, Forbidden
-from src.database import get_post, update_post_status, update_post_message_id, get_user
-from src.config import CHANNEL_ID
+from telegram.error import BadRequest, Forbidden, TelegramError
+from src.repository import (get_post, transition_post, update_post_message_id, bulk_update_status,
+                            get_unpublished_posts, record_publish_failure)
+from src.config import CHANNEL_ID, CHANNEL_USERNAME, RESUME_PUBLISH_HOURS, RESUME_MAX_ATTEMPTS
+from src import matching, sender
 import logging
 
 logger = logging.getLogger(__name__)
 
+# ==========================================
+#      SHARED: PARSE / RENDER / PUBLISH
+# ==========================================
+
+def post_fields(post):
+    """(title, location, description) from the structured columns, with display fallbacks."""
+    return post['title'], post['location'] or "Unknown", post['description'] or ""
+
+def render_public_post(post, title, location_text, desc):
+    """Builds the channel text, its contact button and the label of the user's close button."""
+    post_id = post['post_id']
+    if post['type'] == 'LOST':
+        header = f"🔴 LOST: {title}"
+        status_line = f"📢 Help Needed!"
+        public_btn_text = "🙋‍♂️ I Found It"
+        user_close_btn = "🎉 I Found My Item"
+    elif post['type'] == 'FOUND':
+        header = f"🟢 FOUND: {title}"
+        status_line = f"❓ Is this yours?"
+        public_btn_text = "🫵 It's Mine"
+        user_close_btn = "🤝 Owner Found / Returned"
+    else: # SELL
+        header = f"📦 {title}"
+        status_line = f"💰 Price: {post['price']} ETB\n🛠 📜Condition: {post['condition']}"
+        public_btn_text = "📩 Contact Seller"
+        user_close_btn = "🔴 Mark as Sold"
+
+    public_text = (
+        f"{header}\n"
+        f"➖➖➖➖➖➖➖➖\n"
+        f"{status_line}\n"
+        f"⛩️ Location: {location_text}\n"
+        f"➖➖➖➖➖➖➖➖\n"
+        f"📝 {desc}\n"
+        f"➖➖➖➖➖➖➖➖\n"
+        f"🆔 Post ID: `{post_id}`"
+        f"➖➖➖➖➖➖➖➖\n"
+        f"@dbumarketersbot : use this link to access the bot\n"
+    )
+    
+    contact_url = f"tg://user?id={post['user_id']}"
+    channel_markup = InlineKeyboardMarkup([[InlineKeyboardButton(public_btn_text, url=contact_url)]])
+    return public_text, channel_markup, user_close_btn
+
+# Status line of a closed channel post (see render_closed_post)
+CLOSED_LABELS = {
+    'LOST': "✅ Status: FOUND (Case Closed)",
+    'FOUND': "🤝 Status: RETURNED (Owner Found)",
+    'SELL': "🔴 Status: SOLD",
+}
+
+def render_closed_post(post, status_label):
+    """Channel text for a post that is no longer live (sold, found, expired)."""
+    title, location_text, desc = post_fields(post)
+    return (
+        f"🏁 CASE CLOSED: {title}\n"
+        f"➖➖➖➖➖➖➖➖\n"
+        f"{status_label}\n"
+        f"📍 Location: {location_text}\n"
+        f"➖➖➖➖➖➖➖➖\n"
+        f"📝 {desc}\n"
+        f"➖➖➖➖➖➖➖➖\n"
+        f"🆔 Post ID: `{post['post_id']}`\n"
+        f"➖➖➖➖➖➖➖➖\n"
+        f"@dbumarketersbot : use this link to access the bot"
+    )
+
+async def edit_channel_post(bot, post, text, rate_limit_args=None):
+    """Replaces a published post's channel text and drops its contact button.
+
+    `rate_limit_args` picks the send scheduler lane (default: the channel's own).
+    """
+    if post['photo_id'] and post['photo_id'] != 'skipped':
+        await bot.edit_message_caption(
+            chat_id=CHANNEL_ID,
+            message_id=post['message_id'],
+            caption=text,
+            parse_mode='Markdown',
+            reply_markup=None,
+            rate_limit_args=rate_limit_args
+        )
+    else:
+        await bot.edit_message_text(
+            chat_id=CHANNEL_ID,
+            message_id=post['message_id'],
+            text=text,
+            parse_mode='Markdown',
+            reply_markup=None,
+            rate_limit_args=rate_limit_args
+        )
+
+async def publish_post(bot, post):
+    """Sends an approved post to the channel and links the message. Returns (title, user_close_btn)."""
+    title, location_text, desc = post_fields(post)
+    public_text, channel_markup, user_close_btn = render_public_post(post, title, location_text, desc)
+
+    if post['photo_id'] and post['photo_id'] != 'skipped':
+        msg = await bot.send_photo(
+            chat_id=CHANNEL_ID,
+            photo=post['photo_id'],
+            caption=public_text,
+            reply_markup=channel_markup,
+            parse_mode='Markdown'
+        )
+    else:
+        msg = await bot.send_message(
+            chat_id=CHANNEL_ID,
+            text=public_text,
+            reply_markup=channel_markup,
+            parse_mode='Markdown'
+        )
+    
+    await update_post_message_id(post['post_id'], msg.message_id)
+
+    if post['type'] in ('LOST', 'FOUND'):
+        matching.index.add(post['post_id'], post['type'], post['user_id'], title, location_text, desc, msg.message_id)
+        await notify_matches(bot, post, title, location_text, desc, msg.message_id)
+    return title, user_close_btn
+
+async def notify_matches(bot, post, title, location_text, desc, message_id):
+    """DMs the authors of open opposite-type posts that look like the same item."""
+    link = f"https://t.me/{CHANNEL_USERNAME}/{message_id}"
+    matches = matching.index.match(post['type'], title, location_text, desc, exclude_user=post['user_id'])
+    for score, candidate in matches:
+        if post['type'] == 'FOUND':
+            text = (f"🔎 Possible match for your lost item '{candidate.title}'!\n\n"
+                    f"Someone just reported FOUND: {title}\n📍 {location_text}\n{link}")
+        else:
+            text = (f"🔎 Someone just reported LOST: {title}\n📍 {location_text}\n\n"
+                    f"It may be the '{candidate.title}' you found.\n{link}")
+        try:
+            await bot.send_message(chat_id=candidate.user_id, text=text)
+            logger.info(f"Match {post['post_id']} <-> {candidate.post_id} (score {score:.2f}) notified")
+        except Exception as e:
+            logger.warning(f"Could not notify match for post {candidate.post_id}: {e}")
+
+async def notify_post_live(bot, post, title, user_close_btn):
+    """DMs the author that the post is live, with the button to close it later."""
+    control_markup = InlineKeyboardMarkup([
+        [InlineKeyboardButton(user_close_btn, callback_data=f"sold_{post['post_id']}")]
+    ])
+    
+    try:
+        await bot.send_message(
+            chat_id=post['user_id'],
+            text=(
+                f"✅ Your Post is Live!\n\n"
+                f"Item: {title}\n"
+                f"Status: Published to Channel\n"
+                f"you can get the channel by: @dbumarketers\n\n"
+                f"👇 Click the button below ONLY when the transaction is finished:"
+            ),
+            reply_markup=control_markup
+        )
+    except Exception as e:
+        logger.error(f"❌ COULD NOT NOTIFY USER {post['user_id']}: {e}")
+
+async def notify_post_rejected(bot, post, title):
+    """Tells the author (plain text) that the post was declined."""
+    try:
+        await bot.send_message(
+            chat_id=post['user_id'], 
+            text=f"❌ Your post for '{title}' was declined."
+        )
+    except Forbidden:
+        logger.warning(f"Bot forbidden to message user {post['user_id']}.")
+    except Exception as e:
+        logger.error(f"Failed to notify user {post['user_id']}: {e}")
+
+# ==========================================
+#        CONCURRENCY: ONE CLICK WINS
+# ==========================================
+
+ALREADY_HANDLED = "⏭️ Already handled"
+
+# In-process lock per post: a second click on the same post while the first is still
+# running is turned away at once, before any DB or API call. Across processes (and
+# against /approve_all) the compare-and-set in transition_post decides.
+_post_locks = weakref.WeakValueDictionary()
+
+def post_lock(post_id):
+    lock = _post_locks.get(post_id)
+    if lock is None:
+        lock = _post_locks[post_id] = asyncio.Lock()
+    return lock
+
+async def reject_duplicate(query, remove_buttons=False):
+    """Answers a losing callback without touching the post."""
+    await query.answer(ALREADY_HANDLED)
+    if remove_buttons:
+        try:
+            await query.edit_message_reply_markup(reply_markup=None)
+        except Exception:
+            pass
+
+async def tag_admin_message(message, text):
+    """Replaces the admin-group copy of a post with `text` and drops its buttons (cosmetic: errors are logged)."""
+    try:
+        if message.photo:
+            await message.edit_caption(caption=text, reply_markup=None)
+        else:
+            await message.edit_text(text=text, reply_markup=None)
+    except Exception as e:
+        logger.warning(f"Failed to update admin message text: {e}")
+
 async def handle_approval(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles Admin clicks on Approve/Reject."""
     query = update.callback_query
-    await query.answer()
     
     # 1. ROBUST PARSING
     data = query.data or ""
@@ -21,254 +231,318 @@ async def handle_approval(update: Update, context: ContextTypes.DEFAULT_TYPE):
         post_id = int(parts[-1])
     except (IndexError, ValueError):
         logger.error(f"Invalid callback data: {data}")
+        await query.answer()
+        return
+
+    lock = post_lock(post_id)
+    if lock.locked():
+        await reject_duplicate(query)
         return
 
+    async with lock:
+        await moderate_post(query, context, action, post_id)
+
+async def moderate_post(query, context, action, post_id):
+    """Approve/Reject body of handle_approval, run while holding the post's lock."""
     try:
-        post = get_post(post_id)
+        post = await get_post(post_id)
         if not post:
+            await query.answer()
             await query.edit_message_caption("⚠️ Error: Post not found.")
             return
 
+        # 2. CLAIM THE POST: only the caller that flips PENDING gets to publish / notify
+        new_status = 'APPROVED' if action == "approve" else 'REJECTED'
+        if not await transition_post(post_id, 'PENDING', new_status):
+            await reject_duplicate(query, remove_buttons=True)
+            return
+        await query.answer()
+
         # --- PREPARE DATA ---
-        lines = post['content'].splitlines()
-        title = lines[0]
+        title = post['title']
         
         # Grab the ORIGINAL Admin Message content to preserve it
         # We check if it's a caption (photo) or text (no photo)
         original_content = query.message.caption or query.message.text or f"Item: {title}"
+        # The admin group is the slowest chat (20 msgs/min): its single status edit runs in
+        # the background so the channel post and the author's DM never wait behind it
+        def tag_admin(text):
+            context.application.create_task(tag_admin_message(query.message, text))
 
         # ==========================================
         #             REJECT FLOW
         # ==========================================
         if action == "reject":
-            update_post_status(post_id, 'REJECTED')
-            
-            # 1. Hide Admin Buttons (Keep content visible)
-            try:
-                await query.edit_message_reply_markup(reply_markup=None)
-            except Exception:
-                pass
-
-            # 2. Add "REJECTED" Tag to existing message
-            updated_content = f"❌ REJECTED ❌\n\n{original_content}"
-            
-            try:
-                if query.message.photo:
-                    await query.edit_message_caption(caption=updated_content)
-                else:
-                    await query.edit_message_text(text=updated_content)
-            except Exception as e:
-                logger.warning(f"Failed to update admin message text: {e}")
-
-            # 3. Notify User (Plain Text)
-            try:
-                await context.bot.send_message(
-                    chat_id=post['user_id'], 
-                    text=f"❌ Your post for '{title}' was declined."
-                )
-            except Forbidden:
-                logger.warning(f"Bot forbidden to message user {post['user_id']}.")
-            except Exception as e:
-                logger.error(f"Failed to notify user {post['user_id']}: {e}")
+            tag_admin(f"❌ REJECTED ❌\n\n{original_content}")
+            await notify_post_rejected(context.bot, post, title)
 
         # ==========================================
         #             APPROVE FLOW
         # ==========================================
-        elif action == "approve":
-            update_post_status(post_id, 'APPROVED')
-            
-            # 1. Hide Admin Buttons First
-            try:
-                await query.edit_message_reply_markup(reply_markup=None)
-            except Exception:
-                pass
-
-            # 2. Add "APPROVED" Tag to existing message (Immediate Feedback)
-            updated_content = f"✅ APPROVED\n\n{original_content}"
-            try:
-                if query.message.photo:
-                    await query.edit_message_caption(caption=updated_content)
-                else:
-                    await query.edit_message_text(text=updated_content)
-            except Exception:
-                pass
-
-            # 3. PREPARE PUBLIC CHANNEL POST
-            seller = get_user(post['user_id'])
-            # Extract location from DB content or User Profile
-            location_text = seller['location'] if seller else "Unknown"
-            desc_start_index = 1
-            if len(lines) > 1 and lines[1].startswith("Location: "):
-                location_text = lines[1].replace("Location: ", "")
-                desc_start_index = 2
-            desc = "\n".join(lines[desc_start_index:]) if len(lines) > desc_start_index else ""
-
-            if post['type'] == 'LOST':
-                header = f"🔴 LOST: {title}"
-                status_line = f"📢 Help Needed!"
-                public_btn_text = "🙋‍♂️ I Found It"
-                user_close_btn = "🎉 I Found My Item"
-            elif post['type'] == 'FOUND':
-                header = f"🟢 FOUND: {title}"
-                status_line = f"❓ Is this yours?"
-                public_btn_text = "🫵 It's Mine"
-                user_close_btn = "🤝 Owner Found / Returned"
-            else: # SELL
-                header = f"📦 {title}"
-                status_line = f"💰 Price: {post['price']} ETB\n🛠 📜Condition: {post['condition']}"
-                public_btn_text = "📩 Contact Seller"
-                user_close_btn = "🔴 Mark as Sold"
-
-            public_text = (
-                f"{header}\n"
-                f"➖➖➖➖➖➖➖➖\n"
-                f"{status_line}\n"
-                f"⛩️ Location: {location_text}\n"
-                f"➖➖➖➖➖➖➖➖\n"
-                f"📝 {desc}\n"
-                f"➖➖➖➖➖➖➖➖\n"
-                f"🆔 Post ID: `{post_id}`"
-                f"➖➖➖➖➖➖➖➖\n"
-                f"@dbumarketersbot : use this link to access the bot\n"
-            )
-            
-            contact_url = f"tg://user?id={post['user_id']}"
-            channel_markup = InlineKeyboardMarkup([[InlineKeyboardButton(public_btn_text, url=contact_url)]])
-            
+        else:
+            # 1. PUBLISH TO CHANNEL (before any admin-group edit)
             try:
-                # Send to Channel
-                if post['photo_id'] and post['photo_id'] != 'skipped':
-                    msg = await context.bot.send_photo(
-                        chat_id=CHANNEL_ID,
-                        photo=post['photo_id'],
-                        caption=public_text,
-                        reply_markup=channel_markup,
-                        parse_mode='Markdown'
-                    )
-                else:
-                    msg = await context.bot.send_message(
-                        chat_id=CHANNEL_ID,
-                        text=public_text,
-                        reply_markup=channel_markup,
-                        parse_mode='Markdown'
-                    )
-                
-                update_post_message_id(post_id, msg.message_id)
-
-                # Update Admin Message FINAL confirmation
-                # (We already added "APPROVED" above, we can leave it or add "PUBLISHED")
-                final_admin_content = f"✅ APPROVED & PUBLISHED\n\n{original_content}"
-                if query.message.photo:
-                    await query.edit_message_caption(caption=final_admin_content)
-                else:
-                    await query.edit_message_text(text=final_admin_content)
-
+                title, user_close_btn = await publish_post(context.bot, post)
             except Exception as e:
                 logger.error(f"Failed to post to channel: {e}")
-                # Try to warn admin if channel post failed
-                try:
-                    fail_text = f"⚠️ CHANNEL POST FAILED (Check Permissions)\n\n{original_content}"
-                    if query.message.photo:
-                        await query.edit_message_caption(caption=fail_text)
-                    else:
-                        await query.edit_message_text(text=fail_text)
-                except: pass
+                tag_admin(f"⚠️ CHANNEL POST FAILED (Check Permissions)\n\n{original_content}")
                 return
 
-            # 4. NOTIFY USER
-            control_markup = InlineKeyboardMarkup([
-                [InlineKeyboardButton(user_close_btn, callback_data=f"sold_{post_id}")]
-            ])
-            
-            try:
-                await context.bot.send_message(
-                    chat_id=post['user_id'],
-                    text=(
-                        f"✅ Your Post is Live!\n\n"
-                        f"Item: {title}\n"
-                        f"Status: Published to Channel\n"
-                        f"you can get the channel by: @dbumarketers\n\n"
-                        f"👇 Click the button below ONLY when the transaction is finished:"
-                    ),
-                    reply_markup=control_markup
-                )
-            except Exception as e:
-                logger.error(f"❌ COULD NOT NOTIFY USER {post['user_id']}: {e}")
+            # 2. Tag the admin message (buttons dropped in the same edit)
+            tag_admin(f"✅ APPROVED & PUBLISHED\n\n{original_content}")
+
+            # 3. NOTIFY USER
+            await notify_post_live(context.bot, post, title, user_close_btn)
 
     except Exception:
-        logger.exception(f"Critical error in handle_approval. callback_data={data}")
+        logger.exception(f"Critical error in handle_approval. callback_data={query.data}")
 
 
 async def handle_sold_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handles the User clicking the 'Close Case' button."""
     query = update.callback_query
-    await query.answer()
     
     data = query.data or ""
     parts = data.split('_')
     
     try:
         post_id = int(parts[-1])
-        post = get_post(post_id)
+    except (IndexError, ValueError):
+        logger.error(f"Invalid callback data: {data}")
+        await query.answer()
+        return
+
+    lock = post_lock(post_id)
+    if lock.locked():
+        await reject_duplicate(query)
+        return
+
+    async with lock:
+        await close_post(query, context, post_id)
+
+async def close_post(query, context, post_id):
+    """Body of handle_sold_status, run while holding the post's lock."""
+    try:
+        post = await get_post(post_id)
         if not post:
+            await query.answer()
             await query.edit_message_text("⚠️ Error: Post no longer exists.")
             return
 
-        update_post_status(post_id, 'SOLD')
+        if not await transition_post(post_id, 'APPROVED', 'SOLD'):
+            await reject_duplicate(query)
+            return
+        await query.answer()
+        matching.index.remove(post_id)
         
         # Prepare Channel Update
-        lines = post['content'].splitlines()
-        title = lines[0]
-        
-        seller = get_user(post['user_id'])
-        location_text = seller['location'] if seller else "Unknown"
-        desc_start_index = 1
-        if len(lines) > 1 and lines[1].startswith("Location: "):
-            location_text = lines[1].replace("Location: ", "")
-            desc_start_index = 2
-        desc = "\n".join(lines[desc_start_index:]) if len(lines) > desc_start_index else ""
-        
-        if post['type'] == 'LOST':
-            status_label = "✅ Status: FOUND (Case Closed)"
-        elif post['type'] == 'FOUND':
-            status_label = "🤝 Status: RETURNED (Owner Found)"
-        else:
-            status_label = "🔴 Status: SOLD"
-
-        updated_text = (
-            f"🏁 CASE CLOSED: {title}\n"
-            f"➖➖➖➖➖➖➖➖\n"
-            f"{status_label}\n"
-            f"📍 Location: {location_text}\n"
-            f"➖➖➖➖➖➖➖➖\n"
-            f"📝 {desc}\n"
-            f"➖➖➖➖➖➖➖➖\n"
-            f"🆔 Post ID: `{post_id}`\n"
-            f"➖➖➖➖➖➖➖➖\n"
-            f"@dbumarketersbot : use this link to access the bot"
-        )
-        
+        status_label = CLOSED_LABELS.get(post['type'], CLOSED_LABELS['SELL'])
         try:
-            if post['photo_id'] and post['photo_id'] != 'skipped':
-                await context.bot.edit_message_caption(
-                    chat_id=CHANNEL_ID,
-                    message_id=post['message_id'],
-                    caption=updated_text,
-                    parse_mode='Markdown',
-                    reply_markup=None 
-                )
-            else:
-                await context.bot.edit_message_text(
-                    chat_id=CHANNEL_ID,
-                    message_id=post['message_id'],
-                    text=updated_text,
-                    parse_mode='Markdown',
-                    reply_markup=None
-                )
+            await edit_channel_post(context.bot, post, render_closed_post(post, status_label))
         except Exception as e:
             logger.warning(f"Could not update channel message: {e}")
 
         await query.edit_message_text(f"✅ Success! Channel post updated to:\n{status_label}", parse_mode='Markdown')
 
     except Exception:
-        logger.exception(f"Error in handle_sold_status. data={data}")
\ No newline at end of file
+        logger.exception(f"Error in handle_sold_status. data={query.data}")
+
+
+# ==========================================
+#             BULK MODERATION
+# ==========================================
+
+# /approve_all & /reject_all selectors: post type, a SELL category keyword, or everything
+BULK_TYPES = {"sell": "SELL", "lost": "LOST", "found": "FOUND"}
+
+def select_pending(posts, selector):
+    """Filters pending posts by selector ('all', 'sell', 'lost', 'found' or a category like 'books')."""
+    selector = selector.lower()
+    if selector == "all":
+        return list(posts)
+    if selector in BULK_TYPES:
+        return [p for p in posts if p['type'] == BULK_TYPES[selector]]
+    return [p for p in posts if p['category'] and selector in p['category'].lower()]
+
+async def finish_moderation(bot, action, post):
+    """Publishes (approve) or notifies (reject) one post whose status already changed."""
+    post_id = post['post_id']
+    try:
+        if action == "approve":
+            title, user_close_btn = await publish_post(bot, post)
+            await notify_post_live(bot, post, title, user_close_btn)
+            return post_id, f"✅ published: {title}"
+        title = post['title']
+        await notify_post_rejected(bot, post, title)
+        return post_id, f"❌ rejected: {title}"
+    except Exception as e:
+        logger.error(f"Bulk {action} failed for post {post_id}: {e}")
+        return post_id, f"⚠️ failed: {e}"
+
+async def bulk_moderate(bot, action, posts):
+    """Approves or rejects many pending posts at once.
+
+    The status flip is one transaction; only posts that were still PENDING are then
+    published (or notified) concurrently, the send scheduler keeping us within the
+    channel/user rate limits. Returns [(post_id, result text)] in input order.
+    A restart before every post is out leaves them APPROVED without a channel
+    message: resume_publishing picks those up on the next start.
+    """
+    new_status = 'APPROVED' if action == "approve" else 'REJECTED'
+    changed = set(await bulk_update_status([p['post_id'] for p in posts], 'PENDING', new_status))
+
+    async def moderate_one(post):
+        if post['post_id'] not in changed:
+            return post['post_id'], "⏭️ already handled"
+        return await finish_moderation(bot, action, post)
+
+    return await asyncio.gather(*(moderate_one(p) for p in posts))
+
+async def resume_publishing(bot):
+    """Publishes APPROVED posts that never got a channel message; returns [(post_id, result text)].
+
+    Run once at startup, when no publish from this process can still be in flight
+    (otherwise a post being published right now would go out twice). Only posts
+    approved in the last RESUME_PUBLISH_HOURS are picked up, and a post that keeps
+    failing is dropped after RESUME_MAX_ATTEMPTS boots.
+    """
+    posts = await get_unpublished_posts(RESUME_PUBLISH_HOURS * 3600, RESUME_MAX_ATTEMPTS)
+
+    async def resume_one(post):
+        post_id = post['post_id']
+        try:
+            title, user_close_btn = await publish_post(bot, post)
+        except Exception as e:
+            attempts = await record_publish_failure(post_id)
+            logger.error(f"Resuming post {post_id} failed (attempt {attempts}/{RESUME_MAX_ATTEMPTS}): {e}")
+            gave_up = ", giving up" if attempts >= RESUME_MAX_ATTEMPTS else ""
+            return post_id, f"⚠️ failed (attempt {attempts}/{RESUME_MAX_ATTEMPTS}{gave_up}): {e}"
+        await notify_post_live(bot, post, title, user_close_btn)
+        return post_id, f"✅ published: {title}"
+
+    return await asyncio.gather(*(resume_one(p) for p in posts))
+
+
+# ==========================================
+#             BAN CLEANUP
+# ==========================================
+
+RETRACT_BATCH = 100          # deleteMessages takes up to 100 ids per call
+PROGRESS_EVERY = 5.0         # seconds between progress edits (the admin chat allows ~20 msgs/min)
+FAILED_IDS_PER_MESSAGE = 400 # message ids listed per summary message (Telegram caps a message at 4096 chars)
+REDACTED_TEXT = "🚫 This listing was removed by the moderators."
+
+def _gone(error):
+    return "not found" in str(error).lower()
+
+async def retract_message(bot, post):
+    """Deletes one channel post, or blanks it when Telegram refuses (e.g. older than 48h).
+
+    Returns 'deleted', 'redacted' or 'failed'; never raises a TelegramError.
+    """
+    try:
+        await bot.delete_message(chat_id=CHANNEL_ID, message_id=post['message_id'], rate_limit_args=sender.ADMIN)
+        return "deleted"
+    except BadRequest as e:
+        if _gone(e):
+            return "deleted"
+    except TelegramError as e:
+        logger.error(f"Cannot delete channel message {post['message_id']}: {e}")
+        return "failed"
+
+    try:
+        if post['photo_id'] and post['photo_id'] != 'skipped':
+            await bot.edit_message_caption(chat_id=CHANNEL_ID, message_id=post['message_id'], caption=REDACTED_TEXT,
+                                           reply_markup=None, rate_limit_args=sender.ADMIN)
+        else:
+            await bot.edit_message_text(chat_id=CHANNEL_ID, message_id=post['message_id'], text=REDACTED_TEXT,
+                                        reply_markup=None, rate_limit_args=sender.ADMIN)
+        return "redacted"
+    except BadRequest as e:
+        if "not modified" in str(e).lower():
+            return "redacted"
+        if _gone(e):
+            return "deleted"
+        logger.error(f"Cannot redact channel message {post['message_id']}: {e}")
+    except TelegramError as e:
+        logger.error(f"Cannot redact channel message {post['message_id']}: {e}")
+    return "failed"
+
+def render_retract_progress(user_id, done, total, counts):
+    return (f"🧹 Retracting channel posts of `{user_id}`: {done}/{total}\n"
+            f"🗑️ {counts['deleted']} deleted | ✏️ {counts['redacted']} redacted | ⚠️ {counts['failed']} failed")
+
+async def send_retract_summary(bot, chat_id, user_id, total, counts, failed):
+    """Final /ban cleanup report, listing the message ids still in the channel for manual cleanup."""
+    texts = [f"✅ Ban cleanup for `{user_id}` done: {counts['deleted']} deleted, "
+             f"{counts['redacted']} redacted, {counts['failed']} failed (of {total})."]
+    for start in range(0, len(failed), FAILED_IDS_PER_MESSAGE):
+        ids = ", ".join(str(message_id) for message_id in failed[start:start + FAILED_IDS_PER_MESSAGE])
+        texts.append(f"⚠️ Still in the channel, remove by hand (message ids):\n{ids}")
+    try:
+        for text in texts:
+            await bot.send_message(chat_id=chat_id, text=text, parse_mode='Markdown')
+    except Exception as e:
+        logger.error(f"Could not send the ban cleanup summary for {user_id}: {e}")
+
+async def retract_channel_posts(bot, chat_id, user_id, posts):
+    """Background part of /ban: removes a banned user's channel posts and reports progress.
+
+    Batches go through deleteMessages in the send scheduler's lowest lane, so a
+    big cleanup never delays user replies or new listings. When Telegram refuses
+    a batch, its posts are retried one by one (delete, else redact). The DB rows
+    are already gone, so whatever happens the summary lists the message ids that
+    are still in the channel.
+    """
+    counts = collections.Counter()
+    failed = []
+    total, done = len(posts), 0
+    try:
+        try:
+            progress = await bot.send_message(chat_id=chat_id, parse_mode='Markdown',
+                                              text=render_retract_progress(user_id, 0, total, counts))
+        except TelegramError as e:
+            logger.warning(f"Could not send ban cleanup progress for {user_id}: {e}")
+            progress = None
+        last_report = time.monotonic()
+        for start in range(0, total, RETRACT_BATCH):
+            batch = posts[start:start + RETRACT_BATCH]
+            try:
+                await bot.delete_messages(chat_id=CHANNEL_ID, message_ids=[p['message_id'] for p in batch],
+                                          rate_limit_args=sender.ADMIN)
+                counts["deleted"] += len(batch)
+                done += len(batch)
+            except BadRequest as e:
+                logger.info(f"Bulk delete refused ({e}), retracting {len(batch)} posts one by one")
+                for post in batch:
+                    result = await retract_message(bot, post)
+                    counts[result] += 1
+                    if result == "failed":
+                        failed.append(post['message_id'])
+                    done += 1
+            except Forbidden as e:
+                logger.error(f"Bot cannot delete in the channel: {e}")
+                break
+            except TelegramError as e:
+                # TimedOut, NetworkError, RetryAfter past its retries: skip the batch, keep going
+                logger.error(f"Bulk delete of {len(batch)} channel posts failed: {e}")
+                counts["failed"] += len(batch)
+                failed += [p['message_id'] for p in batch]
+                done += len(batch)
+
+            if progress is None or (done < total and time.monotonic() - last_report < PROGRESS_EVERY):
+                continue
+            last_report = time.monotonic()
+            try:
+                await progress.edit_text(render_retract_progress(user_id, done, total, counts), parse_mode='Markdown')
+            except TelegramError:
+                pass
+    finally:
+        # Posts never reached (Forbidden, an unexpected error, shutdown) are still in the channel too
+        rest = [p['message_id'] for p in posts[done:]]
+        counts["failed"] += len(rest)
+        failed += rest
+        logger.info(f"Ban cleanup for {user_id}: {dict(counts)} of {total} channel posts")
+        if failed:
+            logger.warning(f"Ban cleanup for {user_id}: channel message ids left in {CHANNEL_ID}: {failed}")
+        await send_retract_summary(bot, chat_id, user_id, total, counts, failed)
@@ -1,13 +1,13 @@
 import re
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, KeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, MessageHandler, filters
-from src.database import get_user, register_seller
+from src.repository import get_user, register_seller
 
 PHONE, NAME, LOCATION, ID_TYPE, ID_INPUT = range(5)
 
 async def start_register(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
-    db_user = get_user(user.id)
+    db_user = await get_user(user.id)
     if db_user and db_user['is_seller']:
         await update.message.reply_text("✅ You are already registered.")
         return ConversationHandler.END
@@ -70,7 +70,7 @@ async def validate_id_and_finish(update: Update, context: ContextTypes.DEFAULT_T
 
     # SAVE TO DB
     user = update.effective_user
-    register_seller(
+    await register_seller(
         user.id, user.username, 
         context.user_data['real_name'], 
         context.user_data['phone'], 
@@ -100,6 +100,8 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 registration_handler = ConversationHandler(
+    name="registration",
+    persistent=True,
     entry_points=[MessageHandler(filters.Regex("^📝 Register$"), start_register)],
     states={
         PHONE: [MessageHandler(filters.CONTACT, save_phone)],
@@ -0,0 +1,95 @@
+import logging
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import ContextTypes
+from telegram.error import Forbidden
+from src.repository import get_post, get_expired_posts, bulk_update_status, renew_post
+from src.config import POST_EXPIRY_DAYS, EXPIRY_BATCH_SIZE
+from src.handlers.admin import (post_lock, reject_duplicate, render_closed_post, edit_channel_post,
+                                publish_post, notify_post_live)
+from src import matching, sender
+
+logger = logging.getLogger(__name__)
+
+EXPIRED_LABEL = "⌛ Status: EXPIRED"
+
+# ==========================================
+#          SWEEPER (JobQueue callback)
+# ==========================================
+
+async def sweep_expired(context: ContextTypes.DEFAULT_TYPE):
+    """Closes the oldest batch of stale APPROVED posts.
+
+    One batch per run keeps every run short: a backlog (e.g. the first sweep after
+    deploying) drains over the next runs. Posts are closed one at a time in the
+    ADMIN lane: the channel allows ~20 edits a minute, and a gathered batch would
+    hold its per-chat slots ahead of new approvals for minutes.
+    """
+    posts = await get_expired_posts(POST_EXPIRY_DAYS * 86400, EXPIRY_BATCH_SIZE)
+    if not posts:
+        return
+    # One transaction for the whole batch; a post sold meanwhile simply doesn't move
+    expired = set(await bulk_update_status([p['post_id'] for p in posts], 'APPROVED', 'EXPIRED'))
+    batch = [p for p in posts if p['post_id'] in expired]
+    for post in batch:
+        await expire_post(context.bot, post)
+    logger.info(f"Expiry sweep: {len(batch)} posts expired")
+
+async def expire_post(bot, post):
+    """Closes one expired post in the channel and offers its owner a renew button."""
+    post_id = post['post_id']
+    matching.index.remove(post_id)
+
+    if post['message_id']:
+        try:
+            await edit_channel_post(bot, post, render_closed_post(post, EXPIRED_LABEL),
+                                    rate_limit_args=sender.ADMIN)
+        except Exception as e:
+            logger.warning(f"Could not update channel message for expired post {post_id}: {e}")
+
+    markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔁 Renew (post again)", callback_data=f"renew_{post_id}")]])
+    try:
+        await bot.send_message(
+            chat_id=post['user_id'],
+            text=f"⌛ Your post '{post['title']}' expired after {POST_EXPIRY_DAYS} days and was closed in the channel.\n"
+                 f"Still available? Tap below to publish it again.",
+            reply_markup=markup
+        )
+    except Forbidden:
+        logger.warning(f"Bot forbidden to message user {post['user_id']}.")
+    except Exception as e:
+        logger.error(f"Failed to send renew prompt to {post['user_id']}: {e}")
+
+# ==========================================
+#               RENEW BUTTON
+# ==========================================
+
+async def handle_renew(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Owner tapped Renew on an expiry notice: re-approve and publish again."""
+    query = update.callback_query
+    try:
+        post_id = int(query.data.split('_')[-1])
+    except (AttributeError, ValueError):
+        await query.answer()
+        return
+
+    lock = post_lock(post_id)
+    if lock.locked():
+        await reject_duplicate(query)
+        return
+
+    async with lock:
+        try:
+            post = await get_post(post_id)
+            if not post or post['user_id'] != query.from_user.id:
+                await query.answer("⚠️ This post is no longer available.")
+                return
+            if not await renew_post(post_id):
+                await reject_duplicate(query, remove_buttons=True)
+                return
+            await query.answer()
+
+            title, user_close_btn = await publish_post(context.bot, post)
+            await query.edit_message_text(f"🔁 '{title}' is live again for another {POST_EXPIRY_DAYS} days.")
+            await notify_post_live(context.bot, post, title, user_close_btn)
+        except Exception:
+            logger.exception(f"Error in handle_renew. data={query.data}")
@@ -1,8 +1,9 @@
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, MessageHandler, filters
-from src.config import ADMIN_GROUP_ID
+from src.config import ADMIN_GROUP_ID, FEEDBACK_WINDOW_HOURS
 # 1. IMPORT DATABASE FUNCTIONS
-from src.database import log_feedback, count_recent_feedback
+from src.repository import log_feedback
+from src.rate_limit import feedback_limiter, format_wait
 
 # State for the conversation
 FEEDBACK_TEXT = 0
@@ -11,12 +12,13 @@ async def start_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Entry point: Asks user for feedback."""
     user = update.effective_user
     
-    # 2. CHECK RATE LIMIT (1 per 24 hours)
-    if count_recent_feedback(user.id) >= 1:
+    # 2. CHECK RATE LIMIT (1 per 24 hours by default)
+    wait = feedback_limiter.check(user.id)
+    if wait:
         await update.message.reply_text(
             "⏳ **Feedback Limit Reached**\n\n"
-            "To prevent spam, you can only send feedback once every 24 hours.\n"
-            "Please try again later!",
+            f"To prevent spam, you can only send {feedback_limiter.limit} feedback every {FEEDBACK_WINDOW_HOURS} hours.\n"
+            f"Please try again in {format_wait(wait)}!",
             parse_mode='Markdown'
         )
         return ConversationHandler.END
@@ -29,13 +31,20 @@ async def start_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
     return FEEDBACK_TEXT
 
+async def forward_to_admins(bot, admin_text):
+    try:
+        await bot.send_message(chat_id=ADMIN_GROUP_ID, text=admin_text, parse_mode='Markdown')
+    except Exception as e:
+        # If admin group ID is wrong or bot kicked, just log it
+        print(f"Failed to send feedback to admin: {e}")
+
 async def receive_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Receives the text and forwards to Admin Group."""
     user = update.effective_user
     feedback_msg = update.message.text
     
     # 3. LOG TO DATABASE (To trigger the limit next time)
-    log_feedback(user.id, feedback_msg)
+    await log_feedback(user.id, feedback_msg)
     
     # Prepare message for Admin Group
     admin_text = (
@@ -46,12 +55,8 @@ async def receive_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"{feedback_msg}"
     )
     
-    # Send to Admin Group
-    try:
-        await context.bot.send_message(chat_id=ADMIN_GROUP_ID, text=admin_text, parse_mode='Markdown')
-    except Exception as e:
-        # If admin group ID is wrong or bot kicked, just log it
-        print(f"Failed to send feedback to admin: {e}")
+    # Send to Admin Group (in the background: its 20 msgs/min must not delay the reply)
+    context.application.create_task(forward_to_admins(context.bot, admin_text), update=update)
 
     # Reply to User
     await update.message.reply_text("✅ **Thank you!** Your feedback has been sent to the admins.")
@@ -71,6 +76,8 @@ async def cancel_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # Handler Definition
 feedback_handler = ConversationHandler(
+    name="feedback",
+    persistent=True,
     entry_points=[MessageHandler(filters.Regex("^📝 Feedback$"), start_feedback)],
     states={
         FEEDBACK_TEXT: [MessageHandler(filters.TEXT & ~filters.COMMAND, receive_feedback)]
@@ -1,8 +1,8 @@
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardMarkup, InlineKeyboardButton, KeyboardButton
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, MessageHandler, filters
-# 1. ADDED count_recent_posts to imports
-from src.database import get_user, create_post, register_seller, count_recent_posts
-from src.config import ADMIN_GROUP_ID
+from src.repository import get_user, create_post, register_seller
+from src.rate_limit import post_limiter, format_wait
+from src.config import ADMIN_GROUP_ID, POST_WINDOW_HOURS
 
 # --- STATES ---
 # Standard Lost/Found States
@@ -14,15 +14,15 @@ AUTH_PHONE, AUTH_NAME, AUTH_LOCATION, AUTH_ID_TYPE, AUTH_ID_INPUT = range(6, 11)
 async def start_lost_found(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     user = update.effective_user
-    db_user = get_user(user.id)
+    db_user = await get_user(user.id)
 
-    # 2. CHECK RATE LIMIT (New Feature)
-    post_count = count_recent_posts(user.id)
-    if post_count >= 3:
+    # 2. CHECK RATE LIMIT (in-memory sliding window)
+    wait = post_limiter.check(user.id)
+    if wait:
         await update.message.reply_text(
             "⏳ **Daily Limit Reached**\n\n"
-            "You have reached your limit of 3 posts per 24 hours.\n"
-            "Please try again tomorrow!"
+            f"You have reached your limit of {post_limiter.limit} posts per {POST_WINDOW_HOURS} hours.\n"
+            f"You can post again in {format_wait(wait)}."
         )
         return ConversationHandler.END
 
@@ -94,7 +94,7 @@ async def auth_finish_reg(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     
     # Save to DB
-    register_seller(
+    await register_seller(
         user.id, user.username, 
         context.user_data['reg_name'], 
         context.user_data['reg_phone'], 
@@ -188,7 +188,7 @@ async def submit_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
         user = update.effective_user
         
         # NOTE: db_user fetch must happen HERE to ensure we catch newly registered users
-        db_user = get_user(user.id)
+        db_user = await get_user(user.id)
         
         # Fallback for "I Lost" users who are guests
         if not db_user:
@@ -199,12 +199,14 @@ async def submit_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
             user_phone = db_user['phone_number']
 
         # Save to DB
-        post_id = create_post(
+        post_id = await create_post(
             user_id=user.id,
             type=data['type'],
             category='LostFound',
             condition='N/A',
-            content=f"{data['name']}\nLocation: {data['final_location']}\n{data['desc']}",
+            title=data['name'],
+            location=data['final_location'],
+            description=data['desc'],
             price="N/A",
             photo_id=data['photo_id']
         )
@@ -223,10 +225,12 @@ async def submit_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
             [InlineKeyboardButton("❌ Reject", callback_data=f"reject_{post_id}")]
         ]
         
+        # Sent in the background: the admin group's 20 msgs/min must not delay the reply below
         if data['photo_id'] != 'skipped':
-            await context.bot.send_photo(ADMIN_GROUP_ID, data['photo_id'], caption=admin_text, reply_markup=InlineKeyboardMarkup(keyboard))
+            notify = context.bot.send_photo(ADMIN_GROUP_ID, data['photo_id'], caption=admin_text, reply_markup=InlineKeyboardMarkup(keyboard))
         else:
-            await context.bot.send_message(ADMIN_GROUP_ID, text=admin_text, reply_markup=InlineKeyboardMarkup(keyboard))
+            notify = context.bot.send_message(ADMIN_GROUP_ID, text=admin_text, reply_markup=InlineKeyboardMarkup(keyboard))
+        context.application.create_task(notify, update=update)
         
         await update.message.reply_text("✅ Sent to Admins!", reply_markup=ReplyKeyboardRemove())
     else:
@@ -244,6 +248,8 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 # HANDLER DEFINITION
 lost_found_handler = ConversationHandler(
+    name="lost_found",
+    persistent=True,
     entry_points=[MessageHandler(filters.Regex("^(📢 I Lost|🙋‍♂️ I Found)$"), start_lost_found)],
     states={
         # Internal Auth Steps
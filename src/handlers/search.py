@@ -0,0 +1,92 @@
+import re
+from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, LinkPreviewOptions
+from telegram.ext import ContextTypes
+from src.repository import search_posts
+from src.config import CHANNEL_USERNAME
+
+PAGE_SIZE = 10
+FILTER_RE = re.compile(r"^(cat|cond|price):(.+)$", re.IGNORECASE)
+
+USAGE = (
+    "🔎 Search listings\n\n"
+    "Usage: /search <words> [cat:books] [cond:used] [price:100-500]\n"
+    "Example: /search calculator cond:used price:-800"
+)
+
+def parse_search_args(args):
+    """Splits /search arguments into free-text words and filters."""
+    terms, filters = [], {}
+    for arg in args:
+        match = FILTER_RE.match(arg)
+        if not match:
+            terms.append(arg)
+            continue
+        key, value = match.group(1).lower(), match.group(2)
+        if key == "cat":
+            filters['category'] = value
+        elif key == "cond":
+            filters['condition'] = value
+        else:
+            low, _, high = value.partition("-")
+            if low.isdigit():
+                filters['min_price'] = int(low)
+            if high.isdigit():
+                filters['max_price'] = int(high)
+    return terms, filters
+
+def build_match(terms):
+    """Turns free text into a safe FTS5 query: every word must appear (as a prefix)."""
+    words = re.findall(r"\w+", " ".join(terms))
+    return " ".join(f'"{word}"*' for word in words)
+
+def render_result(row):
+    title = row['title'] or "Untitled"
+    if row['type'] == 'SELL':
+        line = f"📦 {title} — {row['price']} ETB ({row['condition']})"
+    else:
+        line = f"{'🔴' if row['type'] == 'LOST' else '🟢'} {row['type']}: {title}"
+    if row['message_id']:
+        line += f"\n   https://t.me/{CHANNEL_USERNAME}/{row['message_id']}"
+    return line
+
+async def render_page(state):
+    """Fetches the next page for a stored search; advances its keyset cursor."""
+    rows = await search_posts(
+        state['match'], state.get('category'), state.get('condition'),
+        state.get('min_price'), state.get('max_price'),
+        tuple(state['after']) if state.get('after') else None, PAGE_SIZE + 1,
+    )
+    has_more = len(rows) > PAGE_SIZE
+    rows = rows[:PAGE_SIZE]
+    if not rows:
+        return "🔎 No matching listings found.", None
+
+    state['after'] = [rows[-1]['score'], rows[-1]['post_id']]
+    text = "🔎 Search results\n\n" + "\n\n".join(render_result(row) for row in rows)
+    markup = InlineKeyboardMarkup([[InlineKeyboardButton("More ➡️", callback_data="search_more")]]) if has_more else None
+    return text, markup
+
+async def search_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Command: /search <words> [filters] - Ranked search over live listings."""
+    terms, filters = parse_search_args(context.args or [])
+    match = build_match(terms)
+    if not match:
+        await update.message.reply_text(USAGE)
+        return
+
+    state = context.user_data['search'] = {'match': match, **filters}
+    text, markup = await render_page(state)
+    await update.message.reply_text(text, reply_markup=markup, link_preview_options=LinkPreviewOptions(is_disabled=True))
+
+async def search_more(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handles the 'More' button under search results."""
+    query = update.callback_query
+    await query.answer()
+
+    state = context.user_data.get('search')
+    if not state:
+        await query.edit_message_text("⌛ This search expired. Run /search again.")
+        return
+
+    text, markup = await render_page(state)
+    await query.edit_message_text(text, reply_markup=markup, link_preview_options=LinkPreviewOptions(is_disabled=True))
@@ -1,27 +1,27 @@
 from telegram import Update, ReplyKeyboardMarkup, ReplyKeyboardRemove, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, CommandHandler, MessageHandler, filters
-# 1. ADDED count_recent_posts to imports
-from src.database import get_user, create_post, count_recent_posts
-from src.config import ADMIN_GROUP_ID
+from src.repository import get_user, create_post
+from src.rate_limit import post_limiter, format_wait
+from src.config import ADMIN_GROUP_ID, POST_WINDOW_HOURS
 
 PHOTO, TITLE, PRICE, CONDITION, CATEGORY, DESCRIPTION, CONFIRM = range(7)
 
 async def start_sell(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
-    user = get_user(user_id)
+    user = await get_user(user_id)
     
     # Check 1: Is Registered?
     if not user or not user['is_seller']:
         await update.message.reply_text("⛔ Please Register first from the main menu.")
         return ConversationHandler.END
 
-    # Check 2: Rate Limit (New Feature)
-    post_count = count_recent_posts(user_id)
-    if post_count >= 3:
+    # Check 2: Rate Limit (in-memory sliding window)
+    wait = post_limiter.check(user_id)
+    if wait:
         await update.message.reply_text(
             "⏳ **Daily Limit Reached**\n\n"
-            "You have reached your limit of 3 posts per 24 hours.\n"
-            "Please try again tomorrow!"
+            f"You have reached your limit of {post_limiter.limit} posts per {POST_WINDOW_HOURS} hours.\n"
+            f"You can post again in {format_wait(wait)}."
         )
         return ConversationHandler.END
 
@@ -83,7 +83,7 @@ async def receive_description(update: Update, context: ContextTypes.DEFAULT_TYPE
     
     # Summary
     data = context.user_data
-    user = get_user(update.effective_user.id)
+    user = await get_user(update.effective_user.id)
     
     summary = (
         f"📦 {data['title']}\n"
@@ -100,13 +100,13 @@ async def receive_description(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def confirm_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.text == '✅ Submit':
         user = update.effective_user
-        db_user = get_user(user.id)
+        db_user = await get_user(user.id)
         data = context.user_data
         
         # 1. Save to DB
-        post_id = create_post(
+        post_id = await create_post(
             user.id, 'SELL', data['category'], data['condition'],
-            f"{data['title']}\n{data['desc']}", 
+            data['title'], db_user['location'], data['desc'],
             data['price'], data['photo_id']
         )
         
@@ -130,13 +130,14 @@ async def confirm_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
             [InlineKeyboardButton("❌ Reject", callback_data=f"reject_{post_id}")]
         ]
         
-        await context.bot.send_photo(
+        # Sent in the background: the admin group's 20 msgs/min must not delay the reply below
+        context.application.create_task(context.bot.send_photo(
             chat_id=ADMIN_GROUP_ID,
             photo=data['photo_id'],
             caption=admin_text,
             reply_markup=InlineKeyboardMarkup(keyboard),
             parse_mode='Markdown'
-        )
+        ), update=update)
         
         # 3. FIX NAVIGATION (Fix for Point #1)
         # Give them buttons to continue using the bot
@@ -168,6 +169,8 @@ async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 selling_handler = ConversationHandler(
+    name="selling",
+    persistent=True,
     entry_points=[MessageHandler(filters.Regex("^➕ Sell Item$"), start_sell)],
     states={
         PHOTO: [MessageHandler(filters.PHOTO, receive_photo)],
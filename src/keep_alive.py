@@ -1,5 +1,5 @@
 from flask import Flask
-from threading import Thread
+from src.config import PORT
 
 app = Flask('')
 
@@ -9,8 +9,4 @@ def home():
 
 def run():
     # Render assigns a random port in the PORT env var, or defaults to 8080
-    app.run(host='0.0.0.0', port=8080)
-
-def keep_alive():
-    t = Thread(target=run)
-    t.start()
\ No newline at end of file
+    app.run(host='0.0.0.0', port=PORT)
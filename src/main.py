@@ -1,29 +1,52 @@
+from src import startup  # first: the cold start clock starts when this is imported
+import asyncio
+import functools
 import logging
-from telegram import Update, ReplyKeyboardMarkup
-from telegram.ext import ApplicationBuilder, ContextTypes, CommandHandler, MessageHandler, CallbackQueryHandler, filters
-from src.config import BOT_TOKEN
+import os
+import tempfile
+import threading
+import time
+from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import ApplicationBuilder, ApplicationHandlerStop, ContextTypes, CommandHandler, MessageHandler, CallbackQueryHandler, TypeHandler, filters
+from src.config import (BOT_TOKEN, BOT_MODE, BOT_API_URL, ADMIN_GROUP_ID, CONCURRENT_UPDATES, EXPIRY_SWEEP_MINUTES, METRICS_PORT,
+                        BACKUP_INTERVAL_HOURS, ARCHIVE_POSTS_AFTER_DAYS, ARCHIVE_FEEDBACK_AFTER_DAYS, ARCHIVE_BATCH_SIZE)
 # 1. UPDATED IMPORTS: Added add_to_blacklist, is_blacklisted
-from src.database import init_db, get_user, get_all_users, delete_user_data, add_to_blacklist, is_blacklisted
+from src.database import init_db, load_blacklist
+from src import repository, rate_limit, matching, metrics, backup
+from src.repository import get_user, count_users, get_users_page, export_table_csv, get_pending_posts, delete_user_data, add_to_blacklist, is_blacklisted, get_user_channel_posts
 from src.handlers.auth import registration_handler
 from src.handlers.selling import selling_handler
 from src.handlers.lost_found import lost_found_handler
 from src.handlers.feedback import feedback_handler
-from src.keep_alive import keep_alive
-from src.handlers.admin import handle_approval, handle_sold_status
+from src.handlers.search import search_cmd, search_more
+from src.handlers.admin import handle_approval, handle_sold_status, select_pending, bulk_moderate, resume_publishing, retract_channel_posts
+from src.handlers.expiry import sweep_expired, handle_renew
+from src.sender import SendScheduler
+from src.dispatch import PerUserUpdateProcessor
+from src.persistence import SQLitePersistence
 
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+logger = logging.getLogger(__name__)
+startup.mark("imports")
+
+# --- SECURITY GATE ---
+
+async def blacklist_gate(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Runs before every other handler (group -1) and drops updates from banned users."""
+    user = update.effective_user
+    if not user or not is_blacklisted(user.id):
+        return
+
+    if update.callback_query:
+        await update.callback_query.answer("⛔ You are banned.")
+    elif update.message:
+        await update.message.reply_text("⛔ You have been permanently banned from this bot.")
+    raise ApplicationHandlerStop
 
 # --- MENU NAVIGATION ---
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Entry point: Shows the Main Menu."""
-    user_id = update.effective_user.id
-    
-    # 2. CHECK BLACKLIST (Security)
-    if is_blacklisted(user_id):
-        await update.message.reply_text("⛔ You have been permanently banned from this bot.")
-        return
-
     # Updated keyboard to include Feedback
     keyboard = [
         ['🛒 Marketplace', '🔍 Lost & Found'],
@@ -39,13 +62,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def marketplace_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Shows Marketplace options (Register vs Sell)."""
     user_id = update.effective_user.id
-    
-    # Check Blacklist
-    if is_blacklisted(user_id):
-        await update.message.reply_text("⛔ You are banned.")
-        return
-
-    user = get_user(user_id)
+    user = await get_user(user_id)
     
     if user and user['is_seller']:
         # REGISTERED USER VIEW
@@ -61,10 +78,6 @@ async def marketplace_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def lost_found_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Shows Lost & Found options."""
-    # Check Blacklist
-    if is_blacklisted(update.effective_user.id):
-        return
-
     buttons = [['📢 I Lost', '🙋‍♂️ I Found'], ['🔙 Main Menu']]
     markup = ReplyKeyboardMarkup(buttons, resize_keyboard=True)
     await update.message.reply_text("🔍 Lost & Found Section", reply_markup=markup)
@@ -72,28 +85,249 @@ async def lost_found_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # --- ADMIN COMMANDS ---
 ADMIN_IDS = [7775309813, 6112723745, 1836483387] 
 
+def admin_only(func):
+    """Restricts a command or button handler to ADMIN_IDS."""
+    @functools.wraps(func)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        if update.effective_user.id not in ADMIN_IDS:
+            if update.callback_query:
+                await update.callback_query.answer("⛔ Access Denied.")
+            else:
+                await update.message.reply_text("⛔ Access Denied.")
+            return
+        return await func(update, context)
+    return wrapper
+
+def trusted_chat_only(func):
+    """For commands that send user data (DB files, CSVs): only in an admin's private
+    chat with the bot or in ADMIN_GROUP_ID, never in a group or channel anyone else can read."""
+    @functools.wraps(func)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        chat = update.effective_chat
+        if chat.type != "private" and str(chat.id) != str(ADMIN_GROUP_ID):
+            await update.message.reply_text("⛔ Use this in a private chat with the bot or in the admin group.")
+            return
+        return await func(update, context)
+    return wrapper
+
+USERS_PAGE_SIZE = 20
+
+async def render_users_page(after_id=None, before_id=None):
+    """One keyset page of /users: the text plus Prev/Next buttons."""
+    total = await count_users()
+    if not total:
+        return "👥 Total Users: 0\n(Database is empty)", None
+
+    users, has_more = await get_users_page(after_id, before_id, USERS_PAGE_SIZE)
+    if not users:
+        return f"👥 Total Users: {total}\n\n(No more users)", None
+    lines = [f"👥 Total Users: {total}\n"]
+    lines += [f"ID: `{u['user_id']}` | {u['real_name']} | {u['phone_number']}" for u in users]
+
+    # Moving forward we know a previous page exists if we came from one; and vice versa
+    has_prev = has_more if before_id is not None else after_id is not None
+    has_next = has_more if before_id is None else True
+    buttons = []
+    if has_prev:
+        buttons.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"users_prev_{users[0]['user_id']}"))
+    if has_next:
+        buttons.append(InlineKeyboardButton("Next ➡️", callback_data=f"users_next_{users[-1]['user_id']}"))
+    return "\n".join(lines), InlineKeyboardMarkup([buttons]) if buttons else None
+
+@admin_only
 async def list_users(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    user_id = update.effective_user.id
-    if user_id not in ADMIN_IDS:
-        await update.message.reply_text("⛔ Access Denied.")
+    """Command: /users - First page of registered users."""
+    text, markup = await render_users_page()
+    await update.message.reply_text(text, reply_markup=markup)
+
+@admin_only
+async def users_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handles the Prev/Next buttons under /users."""
+    query = update.callback_query
+    await query.answer()
+
+    _, direction, key = query.data.split('_')
+    if direction == "next":
+        text, markup = await render_users_page(after_id=int(key))
+    else:
+        text, markup = await render_users_page(before_id=int(key))
+    await query.edit_message_text(text, reply_markup=markup)
+
+EXPORTS = {"users": "users", "posts": "posts", "archive": "posts_archive"}
+
+@admin_only
+@trusted_chat_only
+async def export_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Command: /export users|posts|archive - Sends the table as a CSV document."""
+    name = context.args[0].lower() if context.args else ""
+    table = EXPORTS.get(name)
+    if not table:
+        await update.message.reply_text("⚠️ Usage: /export users|posts|archive")
         return
 
-    users = get_all_users()
-    if not users:
-        await update.message.reply_text("👥 Total Users: 0\n(Database is empty)")
+    fd, path = tempfile.mkstemp(prefix=f"{table}_", suffix=".csv")
+    os.close(fd)
+    try:
+        rows = await export_table_csv(table, path)
+        with open(path, "rb") as f:
+            await update.message.reply_document(f, filename=f"{table}.csv", caption=f"📄 {table}: {rows} rows")
+    finally:
+        os.remove(path)
+
+def chunk_lines(lines, limit=4000):
+    """Groups lines into message-sized texts (Telegram caps a message at 4096 chars)."""
+    chunks, current = [], ""
+    for line in lines:
+        if current and len(current) + len(line) + 1 > limit:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+async def send_moderation_report(bot, chat_id, heading, results):
+    lines = [heading] + [f"🆔 {post_id}: {result}" for post_id, result in results]
+    for text in chunk_lines(lines):
+        await bot.send_message(chat_id=chat_id, text=text)
+
+async def run_bulk_moderation(bot, chat_id, action, posts):
+    """Background part of /approve_all & /reject_all: moderates, then reports per post."""
+    results = await bulk_moderate(bot, action, posts)
+    await send_moderation_report(bot, chat_id, f"📋 Bulk {action}: {len(results)} posts", results)
+
+@admin_only
+async def bulk_moderate_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Command: /approve_all|/reject_all [all|sell|lost|found|<category>] - Moderates the pending queue."""
+    action = "approve" if update.message.text.startswith("/approve_all") else "reject"
+    selector = context.args[0] if context.args else "all"
+
+    posts = select_pending(await get_pending_posts(), selector)
+    if not posts:
+        await update.message.reply_text(f"📭 No pending posts match '{selector}'.")
         return
 
-    text = f"👥 Total Users: {len(users)}\n\n"
-    for u in users:
-        text += f"ID: `{u['user_id']}` | {u['real_name']} | {u['phone_number']}\n"
-    await update.message.reply_text(text)
+    await update.message.reply_text(f"⏳ Bulk {action}: {len(posts)} pending posts ('{selector}'). Report follows.")
+    # Publishing hundreds of posts takes minutes under the channel rate limit: never block the handler
+    context.application.create_task(
+        run_bulk_moderation(context.bot, update.effective_chat.id, action, posts), update=update
+    )
+
+@admin_only
+async def stats_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Command: /stats - Runtime counters for tuning caches and limits."""
+    cache = repository.user_cache_stats()
+    sends = context.bot.rate_limiter.stats()
+    processor = context.application.update_processor
+    if isinstance(processor, PerUserUpdateProcessor):
+        updates = processor.stats()
+        updates_line = (f"🧵 Updates: {updates['running']}/{updates['limit']} running, {updates['waiting']} waiting, "
+                        f"avg wait {updates['avg_wait_ms']:.1f} ms over {updates['processed']}\n")
+    else:
+        updates_line = "🧵 Updates: sequential\n"
+    await update.message.reply_text(
+        "📊 Bot Stats\n\n"
+        f"👤 User cache: {cache['size']}/{cache['maxsize']} entries (TTL {cache['ttl']}s)\n"
+        f"   Hits: {cache['hits']} | Misses: {cache['misses']} | Hit ratio: {cache['hit_ratio']:.1%}\n"
+        f"⏳ Rate limiter: {rate_limit.post_limiter.tracked_users()} posters, "
+        f"{rate_limit.feedback_limiter.tracked_users()} feedback senders tracked\n"
+        f"📤 Sender: {sends['sent']} sent, {sends['retries']} RetryAfter retries, {sends['chats']} chats\n"
+        f"   Queued: {sends['queued']}\n"
+        f"{updates_line}"
+    )
+
+# --- BACKUPS ---
+
+# Telegram bots can upload documents up to 50 MB
+MAX_UPLOAD_BYTES = 50 * 1000 * 1000
+
+async def backup_job(context: ContextTypes.DEFAULT_TYPE):
+    """Scheduled online backup; failures are reported to the admin group."""
+    if backup.backup_running():
+        return
+    try:
+        await backup.run_backup()
+    except Exception as e:
+        logger.error(f"Scheduled backup failed: {e}")
+        if ADMIN_GROUP_ID:
+            await context.bot.send_message(chat_id=ADMIN_GROUP_ID, text=f"⚠️ Scheduled backup failed: {e}")
+
+async def send_backup(bot, chat_id):
+    """Background part of /backup: backs up, then sends the file off the machine."""
+    try:
+        path = await backup.run_backup()
+    except Exception as e:
+        await bot.send_message(chat_id=chat_id, text=f"⚠️ Backup failed: {e}")
+        return
+    name, size = os.path.basename(path), os.path.getsize(path)
+    if size > MAX_UPLOAD_BYTES:
+        await bot.send_message(chat_id=chat_id, text=f"💾 {name} ({size / 1e6:.1f} MB) verified, too big to send here.")
+        return
+    with open(path, "rb") as f:
+        await bot.send_document(chat_id=chat_id, document=f, filename=name,
+                                caption=f"💾 {name} ({size / 1e6:.1f} MB, integrity checked)")
+
+@admin_only
+@trusted_chat_only
+async def backup_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Command: /backup - Takes a verified backup now and sends it here."""
+    if backup.backup_running():
+        await update.message.reply_text("⏳ A backup is already running.")
+        return
+    await update.message.reply_text("💾 Backing up. The file follows.")
+    context.application.create_task(send_backup(context.bot, update.effective_chat.id), update=update)
+
+# --- DIAGNOSTICS (off until an admin asks) ---
+
+# src.profiling (and tracemalloc) are only imported once an admin uses these commands
+
+async def send_profile(bot, chat_id, seconds):
+    """Background part of /profile: samples, then sends the report as a document."""
+    from src import profiling
+    report = await profiling.profile_for(seconds)
+    await bot.send_document(chat_id=chat_id, document=report.encode(), filename="profile.txt",
+                            caption=f"🔬 CPU profile ({seconds}s)")
+
+@admin_only
+async def profile_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Command: /profile <seconds> - Samples CPU across all handlers and sends the top functions."""
+    from src import profiling
+    try:
+        seconds = int(context.args[0])
+    except (IndexError, ValueError):
+        await update.message.reply_text(f"⚠️ Usage: /profile <seconds> (1-{profiling.PROFILE_MAX_SECONDS})")
+        return
+    if not 1 <= seconds <= profiling.PROFILE_MAX_SECONDS:
+        await update.message.reply_text(f"⚠️ Pick between 1 and {profiling.PROFILE_MAX_SECONDS} seconds.")
+        return
+    if profiling.profiler_running():
+        await update.message.reply_text("⏳ A profile is already running.")
+        return
+
+    await update.message.reply_text(f"🔬 Profiling for {seconds}s. Report follows.")
+    # The window must not hold up other updates: sample in the background
+    context.application.create_task(send_profile(context.bot, update.effective_chat.id, seconds), update=update)
+
+@admin_only
+async def memsnap_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Command: /memsnap [stop] - tracemalloc diff of the top allocation sites since the last call."""
+    from src import profiling
+    if context.args and context.args[0].lower() == "stop":
+        profiling.stop_memory_tracing()
+        await update.message.reply_text("🧠 Memory tracing stopped.")
+        return
+
+    report = profiling.memory_snapshot()
+    if report is None:
+        await update.message.reply_text("🧠 Memory tracing started. Send /memsnap again later for the diff "
+                                        "(/memsnap stop to turn it off).")
+        return
+    await update.message.reply_document(report.encode(), filename="memsnap.txt", caption="🧠 Allocation growth")
 
 # 3. SEPARATE DELETE COMMAND (Soft Reset)
+@admin_only
 async def delete_user_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Command: /delete [user_id] - Removes data but allows re-registration."""
-    if update.effective_user.id not in ADMIN_IDS:
-        await update.message.reply_text("⛔ Access Denied.")
-        return
 
     try:
         if not context.args:
@@ -104,15 +338,13 @@ async def delete_user_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⚠️ Invalid ID.")
         return
 
-    delete_user_data(target_id)
+    await delete_user_data(target_id)
     await update.message.reply_text(f"🗑️ User `{target_id}` deleted (Data removed). They can re-register.", parse_mode='Markdown')
 
 # 4. UPDATED BAN COMMAND (Hard Ban + Blacklist)
+@admin_only
 async def ban_user_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Command: /ban [user_id] - Deletes data AND Blacklists forever."""
-    if update.effective_user.id not in ADMIN_IDS:
-        await update.message.reply_text("⛔ Access Denied.")
-        return
 
     try:
         if not context.args:
@@ -123,20 +355,134 @@ async def ban_user_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⚠️ Invalid ID.")
         return
 
-    # Perform Both Actions
-    delete_user_data(target_id)   # 1. Clean up
-    add_to_blacklist(target_id)   # 2. Block forever
-    
-    await update.message.reply_text(f"🚫 User `{target_id}` has been **PERMANENTLY BANNED** and data wiped.", parse_mode='Markdown')
+    # Perform Both Actions (channel message ids first: they live in the rows being deleted)
+    posts = await get_user_channel_posts(target_id)
+    await delete_user_data(target_id)   # 1. Clean up
+    await add_to_blacklist(target_id)   # 2. Block forever
 
-if __name__ == '__main__':
-    keep_alive()
+    cleanup = f"\n🧹 Retracting {len(posts)} channel posts, progress follows." if posts else ""
+    await update.message.reply_text(f"🚫 User `{target_id}` has been **PERMANENTLY BANNED** and data wiped.{cleanup}", parse_mode='Markdown')
+    if posts:
+        # Hundreds of deletes under the channel rate limit: never block the handler
+        context.application.create_task(
+            retract_channel_posts(context.bot, update.effective_chat.id, target_id, posts), update=update
+        )
+
+_background_tasks = set()
+
+async def migrate_posts():
+    """Fills the v3 structured post columns for legacy rows without blocking updates."""
+    try:
+        filled = await repository.backfill_post_fields()
+        if filled:
+            logger.info(f"Post field backfill done: {filled} rows migrated")
+    except Exception as e:
+        logger.error(f"Post field backfill stopped (will resume next start): {e}")
+
+async def warm_caches():
+    """Rebuilds the Lost & Found match index while the bot already takes updates."""
+    started = time.perf_counter()
+    try:
+        size = await matching.warm_up(repository.run_db)
+        logger.info(f"Match index warmed: {size} open posts in {(time.perf_counter() - started) * 1000:.0f} ms")
+    except Exception as e:
+        logger.error(f"Match index warm-up failed (matches stay partial until restart): {e}")
+
+async def republish_approved(bot):
+    """Publishes approved posts a restart cut off (e.g. mid /approve_all) and tells the admins."""
+    try:
+        results = await resume_publishing(bot)
+        if not results:
+            return
+        logger.info(f"Resumed publishing of {len(results)} approved posts")
+        if ADMIN_GROUP_ID:
+            await send_moderation_report(bot, ADMIN_GROUP_ID,
+                                         f"📋 Resumed after restart: {len(results)} approved posts", results)
+    except Exception as e:
+        logger.error(f"Resuming unpublished posts failed (will retry next start): {e}")
+
+def start_background(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+async def on_startup(app):
+    """Starts background maintenance once the bot is initialized."""
+    startup.mark("initialize")
+    start_background(warm_caches())
+    start_background(migrate_posts())
+    start_background(republish_approved(app.bot))
+
+_first_update_seen = False
+
+async def note_first_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Group -2: logs the cold start breakdown once, when the first update comes in."""
+    global _first_update_seen
+    if _first_update_seen:
+        return
+    _first_update_seen = True
+    startup.mark("first update")
+    logger.info(f"Startup: {startup.report()}")
+    for phase, seconds in startup.phases():
+        metrics.STARTUP_SECONDS.labels(phase).set(seconds)
+
+# Gauges that need the DB are refreshed here, so a /metrics scrape never touches SQLite
+METRICS_REFRESH_SECONDS = 15
+
+async def refresh_gauges(context: ContextTypes.DEFAULT_TYPE):
+    metrics.PENDING_POSTS.set(await repository.count_pending_posts())
+    metrics.ACTIVE_CONVERSATIONS.set(context.application.persistence.active_conversations())
+
+ARCHIVE_INTERVAL_HOURS = 6
+
+async def archive_job(context: ContextTypes.DEFAULT_TYPE):
+    """Moves closed posts and old feedback out of the hot tables."""
+    posts, feedback = await repository.archive_old_rows(
+        ARCHIVE_POSTS_AFTER_DAYS, ARCHIVE_FEEDBACK_AFTER_DAYS, ARCHIVE_BATCH_SIZE)
+    if posts or feedback:
+        logger.info(f"Archived {posts} closed posts and {feedback} feedback rows")
+
+async def on_shutdown(app):
+    """Lets queued DB writes finish before the process exits."""
+    repository.shutdown()
+
+def load_state():
+    """Schema check, then the state updates depend on (call before the loop starts).
+
+    Bans and post quotas must be right from the first update; the match index is
+    only a cache and is rebuilt by warm_caches() once the bot is serving.
+    """
     init_db()
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    startup.mark("schema")
+    load_blacklist()
+    rate_limit.load_from_db()
+    startup.mark("state")
+
+def build_application(rate_limiter=None):
+    """Builds the Application with every handler registered (does not start it)."""
+    builder = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .rate_limiter(rate_limiter or SendScheduler())
+        .persistence(SQLitePersistence())
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+    )
+    if CONCURRENT_UPDATES > 1:
+        builder = builder.concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES))
+    if BOT_API_URL:
+        builder = builder.base_url(f"{BOT_API_URL}/bot").base_file_url(f"{BOT_API_URL}/file/bot")
+    app = builder.build()
 
     # --- HANDLERS ---
+    # Group -1 runs first for every update, including the conversation handlers
+    app.add_handler(TypeHandler(Update, note_first_update), group=-2)
+    app.add_handler(TypeHandler(Update, blacklist_gate), group=-1)
+
     app.add_handler(CallbackQueryHandler(handle_approval, pattern="^(approve|reject)_"))
     app.add_handler(CallbackQueryHandler(handle_sold_status, pattern="^sold_"))
+    app.add_handler(CallbackQueryHandler(handle_renew, pattern=r"^renew_\d+$"))
+    app.add_handler(CallbackQueryHandler(users_page_callback, pattern=r"^users_(next|prev)_\d+$"))
 
     app.add_handler(registration_handler)
     app.add_handler(selling_handler)
@@ -144,7 +490,15 @@ if __name__ == '__main__':
     app.add_handler(feedback_handler)
     
     app.add_handler(CommandHandler('start', start))
+    app.add_handler(CommandHandler('search', search_cmd))
+    app.add_handler(CallbackQueryHandler(search_more, pattern="^search_more$"))
     app.add_handler(CommandHandler('users', list_users))
+    app.add_handler(CommandHandler('stats', stats_cmd))
+    app.add_handler(CommandHandler('profile', profile_cmd))
+    app.add_handler(CommandHandler('memsnap', memsnap_cmd))
+    app.add_handler(CommandHandler('export', export_cmd))
+    app.add_handler(CommandHandler('backup', backup_cmd))
+    app.add_handler(CommandHandler(['approve_all', 'reject_all'], bulk_moderate_cmd))
     
     # 5. REGISTER NEW COMMANDS
     app.add_handler(CommandHandler('ban', ban_user_cmd))
@@ -154,5 +508,44 @@ if __name__ == '__main__':
     app.add_handler(MessageHandler(filters.Regex("^🔍 Lost & Found$"), lost_found_menu))
     app.add_handler(MessageHandler(filters.Regex("^🔙 Main Menu$"), start))
 
-    print("Bot is polling...")
-    app.run_polling()
\ No newline at end of file
+    # Latency histograms for every handler (see /metrics)
+    metrics.instrument_handlers(app)
+
+    # --- JOBS ---
+    if app.job_queue:
+        app.job_queue.run_repeating(sweep_expired, interval=EXPIRY_SWEEP_MINUTES * 60, first=60, name="expiry_sweep")
+        app.job_queue.run_repeating(refresh_gauges, interval=METRICS_REFRESH_SECONDS, first=1, name="metrics_gauges")
+        app.job_queue.run_repeating(archive_job, interval=ARCHIVE_INTERVAL_HOURS * 3600, first=300, name="archive")
+        # A scale-to-zero machine rarely stays up a full interval: schedule by the newest backup's age
+        interval = BACKUP_INTERVAL_HOURS * 3600
+        app.job_queue.run_repeating(backup_job, interval=interval, first=max(120, backup.seconds_until_due(interval)),
+                                    name="backup")
+    else:
+        logger.warning("JobQueue unavailable (install python-telegram-bot[job-queue]): posts will not expire, no scheduled backups, gauges stay at 0")
+
+    return app
+
+def start_health_check():
+    """Flask keep-alive for local runs, imported in its own thread so polling does not wait for Flask."""
+    def serve():
+        from src.keep_alive import run
+        run()
+    threading.Thread(target=serve, name="keep-alive", daemon=True).start()
+
+def main():
+    load_state()
+    app = build_application()
+    startup.mark("build")
+
+    if BOT_MODE == "webhook":
+        from src.webserver import run_webhook
+        asyncio.run(run_webhook(app))
+    else:
+        # Local runs: long polling + the Flask health check and metrics threads
+        start_health_check()
+        metrics.serve(METRICS_PORT)
+        print("Bot is polling...")
+        app.run_polling()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
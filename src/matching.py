@@ -0,0 +1,180 @@
+"""Lost & Found matching engine.
+
+An in-memory inverted index over open (APPROVED) LOST and FOUND posts. Each post
+is indexed by word tokens and character trigrams of its title, campus and
+description, with per-field weights. When a new FOUND post is approved we score
+it against open LOST posts (and vice versa) by walking only the postings of its
+own features, so the cost grows with the query's matches rather than the
+archive. The index is rebuilt from the DB on startup, in the background once
+the bot is already serving (see warm_up).
+"""
+import asyncio
+import math
+import re
+from collections import defaultdict
+from src import database
+
+FIELD_WEIGHTS = {"title": 3.0, "campus": 1.0, "description": 1.0}
+TRIGRAM_FACTOR = 0.4      # trigrams catch typos/plurals but count less than whole words
+MAX_POSTINGS = 2000       # features more common than this carry no signal and are skipped
+MIN_SCORE = 0.35          # share of the query's weighted features a candidate must cover
+MAX_MATCHES = 3
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "in", "on", "at", "to", "for", "with", "my", "is", "it",
+    "near", "from", "this", "that", "was", "lost", "found", "item", "color", "colour",
+}
+OPPOSITE = {"LOST": "FOUND", "FOUND": "LOST"}
+
+def _tokens(text):
+    return [t for t in re.findall(r"\w+", (text or "").lower()) if len(t) > 1 and t not in STOPWORDS]
+
+def _features(title, campus, description):
+    """feature -> weight for one post ('w:' words, 'g:' trigrams, 'c:' campus)."""
+    features = {}
+
+    def add(feature, weight):
+        if weight > features.get(feature, 0):
+            features[feature] = weight
+
+    for field, text in (("title", title), ("description", description)):
+        weight = FIELD_WEIGHTS[field]
+        for token in _tokens(text):
+            add(f"w:{token}", weight)
+            padded = f"#{token}#"
+            for i in range(len(padded) - 2):
+                add(f"g:{padded[i:i + 3]}", weight * TRIGRAM_FACTOR)
+    if campus:
+        add(f"c:{campus.strip().lower()}", FIELD_WEIGHTS["campus"])
+    return features
+
+def split_location(location):
+    """'🏫 Main Campus - Library 2nd floor' -> ('🏫 Main Campus', 'Library 2nd floor')."""
+    campus, _, specific = (location or "").partition(" - ")
+    return campus, specific
+
+class Candidate:
+    __slots__ = ("post_id", "type", "user_id", "title", "message_id", "features")
+
+    def __init__(self, post_id, type, user_id, title, message_id, features):
+        self.post_id = post_id
+        self.type = type
+        self.user_id = user_id
+        self.title = title
+        self.message_id = message_id
+        self.features = features
+
+class MatchIndex:
+    """Not thread-safe: use it from the event loop (warm_up builds its copy in a thread, then adopts it)."""
+
+    def __init__(self):
+        self._docs = {}                                   # post_id -> Candidate
+        self._postings = {"LOST": defaultdict(set), "FOUND": defaultdict(set)}
+        self._counts = {"LOST": 0, "FOUND": 0}
+        self._removed = None                              # post_ids removed while a rebuild runs
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, post_id, type, user_id, title, location, description, message_id=None):
+        if type not in self._postings:
+            return
+        campus, specific = split_location(location)
+        features = _features(title, campus, f"{specific}\n{description or ''}")
+        self._insert(Candidate(post_id, type, user_id, title, message_id, features))
+
+    def _insert(self, doc):
+        self.remove(doc.post_id)
+        self._docs[doc.post_id] = doc
+        self._counts[doc.type] += 1
+        postings = self._postings[doc.type]
+        for feature in doc.features:
+            postings[feature].add(doc.post_id)
+
+    def remove(self, post_id):
+        if self._removed is not None:
+            self._removed.add(post_id)
+        doc = self._docs.pop(post_id, None)
+        if doc is None:
+            return
+        self._counts[doc.type] -= 1
+        postings = self._postings[doc.type]
+        for feature in doc.features:
+            ids = postings.get(feature)
+            if ids is not None:
+                ids.discard(post_id)
+                if not ids:
+                    del postings[feature]
+
+    def begin_rebuild(self):
+        """Starts recording removals, so adopt() can replay them onto an index built elsewhere."""
+        self._removed = set()
+
+    def adopt(self, rebuilt):
+        """Takes over `rebuilt` (filled off the loop) plus every change made here since begin_rebuild()."""
+        for post_id in self._removed or ():
+            rebuilt.remove(post_id)
+        for doc in self._docs.values():
+            rebuilt._insert(doc)
+        self._docs, self._postings, self._counts = rebuilt._docs, rebuilt._postings, rebuilt._counts
+        self._removed = None
+
+    def remove_user(self, user_id):
+        for post_id in [p for p, doc in self._docs.items() if doc.user_id == user_id]:
+            self.remove(post_id)
+
+    def match(self, type, title, location, description, exclude_user=None, limit=MAX_MATCHES):
+        """Best open posts of the opposite type for a new post, as [(score, Candidate)]."""
+        other = OPPOSITE.get(type)
+        if other is None:
+            return []
+        postings = self._postings[other]
+        total = max(1, self._counts[other])
+
+        campus, specific = split_location(location)
+        query = _features(title, campus, f"{specific}\n{description or ''}")
+        scores = defaultdict(float)
+        query_weight = 0.0
+        for feature, weight in query.items():
+            ids = postings.get(feature)
+            idf = math.log(1 + total / (len(ids) if ids else 1))
+            query_weight += weight * idf
+            if not ids or len(ids) > MAX_POSTINGS:
+                continue
+            for post_id in ids:
+                scores[post_id] += min(weight, self._docs[post_id].features[feature]) * idf
+
+        if not query_weight:
+            return []
+        ranked = []
+        for post_id, score in scores.items():
+            doc = self._docs[post_id]
+            score /= query_weight
+            if score >= MIN_SCORE and doc.user_id != exclude_user:
+                ranked.append((score, doc))
+        ranked.sort(key=lambda item: (-item[0], item[1].post_id))
+        return ranked[:limit]
+
+index = MatchIndex()
+
+def build_index(posts, target=None):
+    """Fills `target` (a new MatchIndex by default) from open LOST/FOUND post dicts."""
+    target = MatchIndex() if target is None else target
+    for post in posts:
+        target.add(post['post_id'], post['type'], post['user_id'], post['title'], post['location'] or "",
+                   post['description'] or "", post['message_id'])
+    return target
+
+async def warm_up(run_db):
+    """Rebuilds the index while the bot is serving: the query runs via `run_db`, the
+    feature extraction in a worker thread, and only the final swap on the loop.
+    Posts approved or closed meanwhile are kept (see MatchIndex.adopt)."""
+    index.begin_rebuild()
+    try:
+        posts = await run_db(database.get_open_lost_found_posts)
+        rebuilt = await asyncio.to_thread(build_index, posts)
+    except BaseException:
+        index._removed = None
+        raise
+    index.adopt(rebuilt)
+    return len(index)
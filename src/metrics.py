@@ -0,0 +1,76 @@
+"""Prometheus metrics, served on /metrics on a private port (METRICS_PORT): by serve() when
+polling, by a second uvicorn listener on the bot's loop in webhook mode (src.webserver).
+
+Recording is an in-memory counter/histogram update (about a microsecond); nothing
+on the hot path does I/O for metrics. Gauges that need the DB are refreshed by a
+JobQueue job (see refresh_gauges in src.main), never by the scrape itself.
+"""
+import functools
+import time
+from prometheus_client import Counter, Gauge, Histogram, start_http_server
+from telegram.ext import ConversationHandler
+
+# --- METRICS ---
+HANDLER_LATENCY = Histogram("bot_handler_seconds", "Handler callback latency", ["handler", "state"])
+DB_CALL_LATENCY = Histogram("bot_db_call_seconds", "src.database call latency on the DB thread", ["function"])
+DB_CALL_ERRORS = Counter("bot_db_call_errors_total", "src.database calls that raised", ["function"])
+API_LATENCY = Histogram("bot_telegram_api_seconds", "Bot API call latency (after throttling)", ["endpoint"])
+API_ERRORS = Counter("bot_telegram_api_errors_total", "Bot API calls that failed", ["endpoint", "error"])
+API_RETRY_AFTER = Counter("bot_telegram_retry_after_total", "RetryAfter (flood control) responses", ["endpoint"])
+UPDATE_WAIT = Histogram("bot_update_wait_seconds", "Time an update waited for its user's turn and a free slot")
+UPDATES_WAITING = Gauge("bot_updates_waiting", "Updates queued in the update processor")
+UPDATES_RUNNING = Gauge("bot_updates_running", "Updates being processed right now")
+STARTUP_SECONDS = Gauge("bot_startup_seconds", "Cold start time per phase (set at the first update)", ["phase"])
+BACKUP_LAST_SUCCESS = Gauge("bot_backup_last_success_timestamp", "Unix time of the last verified backup")
+BACKUP_BYTES = Gauge("bot_backup_bytes", "Size of the last backup (compressed)")
+BACKUP_FAILURES = Counter("bot_backup_failures_total", "Backups that failed or did not verify")
+PENDING_POSTS = Gauge("bot_pending_posts", "Posts waiting for moderation")
+ACTIVE_CONVERSATIONS = Gauge("bot_active_conversations", "Conversations in a non-final state")
+
+def serve(port):
+    """Serves /metrics from a daemon thread on `port` (polling mode; webhook mode serves it on the loop)."""
+    if port:
+        start_http_server(port)
+
+# --- DB CALLS ---
+
+def timed_db_call(func, *args, **kwargs):
+    """Runs a src.database function (on the DB thread) and records its latency."""
+    start = time.perf_counter()
+    try:
+        return func(*args, **kwargs)
+    except Exception:
+        DB_CALL_ERRORS.labels(func.__name__).inc()
+        raise
+    finally:
+        DB_CALL_LATENCY.labels(func.__name__).observe(time.perf_counter() - start)
+
+# --- HANDLERS ---
+
+def _timed(callback, handler, state):
+    observe = HANDLER_LATENCY.labels(handler, state).observe  # child bound once, not per update
+
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            observe(time.perf_counter() - start)
+    return wrapper
+
+def _instrument_conversation(conv):
+    steps = [("entry", conv.entry_points), ("fallback", conv.fallbacks)]
+    steps += [(str(state), handlers) for state, handlers in conv.states.items()]
+    for state, handlers in steps:
+        for handler in handlers:
+            handler.callback = _timed(handler.callback, f"{conv.name}.{handler.callback.__name__}", state)
+
+def instrument_handlers(application):
+    """Wraps every registered callback with a latency timer (conversation steps labelled by state)."""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, ConversationHandler):
+                _instrument_conversation(handler)
+            else:
+                handler.callback = _timed(handler.callback, handler.callback.__name__, "-")
@@ -0,0 +1,147 @@
+"""SQLite-backed PTB persistence stored in market.db.
+
+Keeps conversation states, user_data and bot_data across deploys and crashes.
+PTB calls the update_* methods every `update_interval` seconds with only the
+entries that changed; those are staged here and written in a single
+transaction on the DB thread, never one write per update.
+"""
+import asyncio
+import json
+import logging
+from telegram.ext import BasePersistence, PersistenceInput
+from src import database
+from src.repository import run_db
+
+logger = logging.getLogger(__name__)
+
+USER = "user"
+BOT = "bot"
+CONV = "conv:"
+
+class SQLitePersistence(BasePersistence):
+
+    def __init__(self, update_interval=10):
+        super().__init__(
+            store_data=PersistenceInput(user_data=True, chat_data=False, bot_data=True, callback_data=False),
+            update_interval=update_interval,
+        )
+        self._loaded = None        # kind -> {key: decoded data}, filled on first get_*
+        self._pending = {}         # (kind, key) -> JSON text, or None for delete
+        self._write_task = None
+
+    # --- Loading (one query for everything) ---
+
+    async def _load(self):
+        if self._loaded is None:
+            rows = await run_db(database.load_persistence)
+            loaded = {}
+            for kind, key, data in rows:
+                try:
+                    loaded.setdefault(kind, {})[key] = json.loads(data)
+                except ValueError:
+                    logger.warning(f"Skipping corrupt persistence row {kind}/{key}")
+            self._loaded = loaded
+            logger.info(f"Persistence loaded: {len(rows)} rows")
+        return self._loaded
+
+    async def get_user_data(self):
+        stored = (await self._load()).get(USER, {})
+        return {int(user_id): data for user_id, data in stored.items()}
+
+    async def get_chat_data(self):
+        return {}
+
+    async def get_bot_data(self):
+        return (await self._load()).get(BOT, {}).get(BOT, {})
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        stored = (await self._load()).get(CONV + name, {})
+        return {tuple(json.loads(key)): state for key, state in stored.items()}
+
+    def active_conversations(self):
+        """Number of conversations currently in a non-final state (all handlers)."""
+        if self._loaded is None:
+            return 0
+        return sum(len(states) for kind, states in self._loaded.items() if kind.startswith(CONV))
+
+    # --- Staging ---
+
+    async def _stage(self, kind, key, value):
+        if value is None or value == {}:
+            self._pending[(kind, key)] = None
+        else:
+            try:
+                self._pending[(kind, key)] = json.dumps(value)
+            except (TypeError, ValueError) as e:
+                logger.error(f"Cannot persist {kind}/{key}: {e}")
+                return
+        await self._write_soon()
+
+    async def _write_soon(self):
+        """Lets every update_* call of the current PTB run stage first, then writes them together."""
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write_after_tick())
+        await asyncio.shield(self._write_task)
+
+    async def _write_after_tick(self):
+        await asyncio.sleep(0)
+        await self._write_pending()
+
+    async def _write_pending(self):
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, {}
+        upserts = [(kind, key, data) for (kind, key), data in batch.items() if data is not None]
+        deletes = [(kind, key) for (kind, key), data in batch.items() if data is None]
+        try:
+            await run_db(database.save_persistence, upserts, deletes)
+        except Exception:
+            logger.exception("Persistence write failed, will retry on next run")
+            for item, data in batch.items():
+                self._pending.setdefault(item, data)
+
+    # --- PTB update hooks ---
+
+    async def update_user_data(self, user_id, data):
+        await self._stage(USER, str(user_id), data)
+
+    async def update_chat_data(self, chat_id, data):
+        pass
+
+    async def update_bot_data(self, data):
+        await self._stage(BOT, BOT, data)
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def update_conversation(self, name, key, new_state):
+        json_key = json.dumps(list(key))
+        states = (await self._load()).setdefault(CONV + name, {})
+        if new_state is None:
+            states.pop(json_key, None)
+        else:
+            states[json_key] = new_state
+        await self._stage(CONV + name, json_key, new_state)
+
+    async def drop_chat_data(self, chat_id):
+        pass
+
+    async def drop_user_data(self, user_id):
+        await self._stage(USER, str(user_id), None)
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        if self._write_task and not self._write_task.done():
+            await self._write_task
+        await self._write_pending()
@@ -0,0 +1,138 @@
+"""On-demand diagnostics for /profile and /memsnap.
+
+Nothing here runs until an admin asks: the sampler thread only exists for the
+profiling window and tracemalloc is only started by the first /memsnap.
+"""
+import asyncio
+import collections
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+PROFILE_INTERVAL = 0.005   # 200 samples/s per thread
+PROFILE_MAX_SECONDS = 120
+TOP_FUNCTIONS = 30
+
+def _short_path(path):
+    """Project files relative to the repo, libraries from their package dir."""
+    cwd = os.getcwd()
+    if path.startswith(cwd):
+        return os.path.relpath(path, cwd)
+    marker = "site-packages" + os.sep
+    if marker in path:
+        return path.split(marker, 1)[1]
+    return os.path.basename(path)
+
+def _frame_key(code):
+    return f"{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})"
+
+# --- CPU: sampling profiler ---
+
+class SamplingProfiler:
+    """Periodically snapshots every thread's stack (event loop, DB thread, ...).
+
+    Per thread it counts the leaf function ("self": burning CPU or blocked right
+    there) and every function on the stack ("cum": time spent inside it).
+    """
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.samples = collections.Counter()                     # thread -> samples
+        self.self_counts = collections.defaultdict(collections.Counter)
+        self.cum_counts = collections.defaultdict(collections.Counter)
+        self.started = self.stopped = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self.started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.stopped = time.monotonic()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != me:
+                    self._sample(names.get(ident, str(ident)), frame)
+
+    def _sample(self, thread, frame):
+        self.samples[thread] += 1
+        self.self_counts[thread][_frame_key(frame.f_code)] += 1
+        seen = set()
+        while frame is not None:
+            key = _frame_key(frame.f_code)
+            if key not in seen:
+                seen.add(key)
+                self.cum_counts[thread][key] += 1
+            frame = frame.f_back
+
+    def report(self, limit=TOP_FUNCTIONS):
+        duration = (self.stopped or time.monotonic()) - self.started
+        lines = [f"CPU profile: {duration:.1f}s, sampling every ~{self.interval * 1000:.0f} ms per thread", ""]
+        for thread, total in self.samples.most_common():
+            lines.append(f"== {thread} ({total} samples) ==")
+            for title, counts in (("self", self.self_counts[thread]), ("cumulative", self.cum_counts[thread])):
+                lines.append(f"  -- top {limit} by {title} --")
+                for key, count in counts.most_common(limit):
+                    lines.append(f"  {count / total:6.1%}  {count:6d}  {key}")
+            lines.append("")
+        return "\n".join(lines)
+
+_active_profiler = None
+
+def profiler_running():
+    return _active_profiler is not None
+
+async def profile_for(seconds):
+    """Samples all threads for `seconds` (the event loop keeps serving) and returns the report."""
+    global _active_profiler
+    profiler = _active_profiler = SamplingProfiler()
+    profiler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        await asyncio.to_thread(profiler.stop)
+        _active_profiler = None
+    return profiler.report()
+
+# --- MEMORY: tracemalloc diff ---
+
+_mem_baseline = None
+
+def memory_snapshot(limit=TOP_FUNCTIONS):
+    """First call starts tracemalloc and returns None; later calls diff against the previous snapshot."""
+    global _mem_baseline
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+        _mem_baseline = tracemalloc.take_snapshot()
+        return None
+
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    stats = snapshot.compare_to(_mem_baseline, "lineno")
+    _mem_baseline = snapshot
+
+    current, peak = tracemalloc.get_traced_memory()
+    lines = [f"tracemalloc: {current / 2**20:.1f} MiB traced now, peak {peak / 2**20:.1f} MiB",
+             f"Top {limit} allocation sites by growth since the previous /memsnap:", ""]
+    for stat in stats[:limit]:
+        frame = stat.traceback[0]
+        lines.append(f"{stat.size_diff / 1024:+10.1f} KiB  {stat.size / 1024:10.1f} KiB  "
+                     f"{stat.count_diff:+7d} blocks  {_short_path(frame.filename)}:{frame.lineno}")
+    return "\n".join(lines)
+
+def stop_memory_tracing():
+    global _mem_baseline
+    _mem_baseline = None
+    tracemalloc.stop()
@@ -0,0 +1,71 @@
+import time
+from collections import deque
+from src import database
+from src.config import POST_LIMIT, POST_WINDOW_HOURS, FEEDBACK_LIMIT, FEEDBACK_WINDOW_HOURS
+
+class SlidingWindowLimiter:
+    """Allows `limit` events per user in any rolling window of `window` seconds.
+
+    Each user keeps at most `limit` timestamps, so check() and record() are O(1).
+    State lives in memory and is rebuilt from the DB on startup (see load_from_db).
+    Not thread-safe: use it from the event loop only.
+    """
+
+    PURGE_EVERY = 1000  # records between sweeps of users whose window has fully passed
+
+    def __init__(self, name, limit, window):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self._events = {}  # user_id -> deque of timestamps, oldest first
+        self._records = 0
+
+    def check(self, user_id, now=None):
+        """Returns 0 if the user may act now, otherwise seconds until the next slot frees up."""
+        events = self._events.get(user_id)
+        if not events or len(events) < self.limit:
+            return 0.0
+        now = time.time() if now is None else now
+        wait = events[0] + self.window - now
+        return wait if wait > 0 else 0.0
+
+    def record(self, user_id, timestamp=None):
+        timestamp = time.time() if timestamp is None else timestamp
+        events = self._events.get(user_id)
+        if events is None:
+            events = self._events[user_id] = deque(maxlen=self.limit)
+        events.append(timestamp)
+
+        self._records += 1
+        if self._records % self.PURGE_EVERY == 0:
+            self.purge()
+
+    def purge(self, now=None):
+        """Forgets users whose newest event has left the window."""
+        cutoff = (time.time() if now is None else now) - self.window
+        for user_id in [u for u, events in self._events.items() if events[-1] <= cutoff]:
+            del self._events[user_id]
+
+    def load(self, events):
+        """Replaces the state with (user_id, timestamp) pairs, e.g. straight from the DB."""
+        self._events.clear()
+        for user_id, timestamp in sorted(events, key=lambda e: e[1]):
+            self.record(user_id, timestamp)
+
+    def tracked_users(self):
+        return len(self._events)
+
+# Posts share one quota across Sell / Lost / Found, exactly like the old COUNT(*) check
+post_limiter = SlidingWindowLimiter("posts", POST_LIMIT, POST_WINDOW_HOURS * 3600)
+feedback_limiter = SlidingWindowLimiter("feedback", FEEDBACK_LIMIT, FEEDBACK_WINDOW_HOURS * 3600)
+
+def load_from_db():
+    """Rebuilds both limiters from the posts/feedback tables (call once at startup, off the loop)."""
+    post_limiter.load(database.get_post_times_since(post_limiter.window))
+    feedback_limiter.load(database.get_feedback_times_since(feedback_limiter.window))
+
+def format_wait(seconds):
+    """Turns a wait in seconds into '5h 12m' / '3m' for user-facing messages."""
+    minutes = max(1, int(seconds + 59) // 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h {minutes}m" if hours else f"{minutes}m"
@@ -0,0 +1,152 @@
+"""Async facade over src.database.
+
+Handlers must import DB helpers from here, never from src.database: every call
+is shipped to one dedicated DB thread so a slow query or a write waiting on the
+file lock never stalls the event loop (src.database refuses to run on it).
+"""
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from src import database
+from src.cache import TTLCache, MISSING
+from src.config import USER_CACHE_SIZE, USER_CACHE_TTL
+from src.rate_limit import post_limiter, feedback_limiter
+from src import matching, metrics
+
+# A single worker keeps SQLite access serialized, exactly like the bot was before.
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db")
+
+async def run_db(func, *args, **kwargs):
+    """Runs a blocking src.database function on the DB thread and awaits the result."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(metrics.timed_db_call, func, *args, **kwargs))
+
+def shutdown():
+    """Waits for queued DB work to finish, then closes the shared connection."""
+    _executor.shutdown(wait=True)
+    database.close_connection()
+
+# --- Users ---
+# Profiles are re-read several times per flow (menu, sell steps, approval), so they
+# are cached on the loop side: a hit costs no DB thread hop at all.
+_user_cache = TTLCache(USER_CACHE_SIZE, USER_CACHE_TTL)
+
+def user_cache_stats():
+    return _user_cache.stats()
+
+async def get_user(user_id):
+    user = _user_cache.get(user_id)
+    if user is MISSING:
+        user = await run_db(database.get_user, user_id)
+        _user_cache.set(user_id, user)
+    return user
+
+async def register_seller(user_id, username, real_name, phone_number, id_number, location):
+    await run_db(database.register_seller, user_id, username, real_name, phone_number, id_number, location)
+    _user_cache.invalidate(user_id)
+
+async def count_users():
+    return await run_db(database.count_users)
+
+async def get_users_page(after_id=None, before_id=None, limit=20):
+    return await run_db(database.get_users_page, after_id, before_id, limit)
+
+async def get_user_channel_posts(user_id):
+    return await run_db(database.get_user_channel_posts, user_id)
+
+async def delete_user_data(user_id):
+    await run_db(database.delete_user_data, user_id)
+    _user_cache.invalidate(user_id)
+    matching.index.remove_user(user_id)
+
+# --- Posts ---
+
+async def create_post(user_id, type, category, condition, title, location, description, price, photo_id):
+    post_id = await run_db(database.create_post, user_id, type, category, condition,
+                           title, location, description, price, photo_id)
+    post_limiter.record(user_id)
+    return post_id
+
+async def get_post(post_id):
+    return await run_db(database.get_post, post_id)
+
+async def transition_post(post_id, from_status, to_status):
+    return await run_db(database.transition_post, post_id, from_status, to_status)
+
+async def update_post_message_id(post_id, message_id):
+    await run_db(database.update_post_message_id, post_id, message_id)
+
+async def count_pending_posts():
+    return await run_db(database.count_pending_posts)
+
+async def get_pending_posts(limit=500):
+    return await run_db(database.get_pending_posts, limit)
+
+async def bulk_update_status(post_ids, from_status, to_status):
+    return await run_db(database.bulk_update_status, post_ids, from_status, to_status)
+
+async def get_unpublished_posts(max_age_seconds, max_attempts, limit=500):
+    return await run_db(database.get_unpublished_posts, max_age_seconds, max_attempts, limit)
+
+async def record_publish_failure(post_id):
+    return await run_db(database.record_publish_failure, post_id)
+
+async def get_expired_posts(max_age_seconds, limit=50):
+    return await run_db(database.get_expired_posts, max_age_seconds, limit)
+
+async def renew_post(post_id):
+    return await run_db(database.renew_post, post_id)
+
+async def backfill_post_fields(batch_size=500):
+    """Online v3 migration: one small DB-thread job per batch so live handlers interleave."""
+    total = 0
+    while True:
+        filled = await run_db(database.backfill_post_fields, batch_size)
+        if not filled:
+            return total
+        total += filled
+
+# --- Archive ---
+
+async def archive_old_rows(post_days, feedback_days, batch_size=500):
+    """Moves closed posts / old feedback to the archive tables, one DB-thread job per batch.
+
+    Returns (posts, feedback) moved.
+    """
+    totals = []
+    for func, days in ((database.archive_closed_posts, post_days), (database.archive_old_feedback, feedback_days)):
+        total = 0
+        while moved := await run_db(func, days, batch_size):
+            total += moved
+        totals.append(total)
+    return tuple(totals)
+
+# --- Search ---
+
+async def search_posts(match, category=None, condition=None, min_price=None, max_price=None, after=None, limit=10):
+    return await run_db(database.search_posts, match, category, condition, min_price, max_price, after, limit)
+
+# --- Export ---
+
+async def export_table_csv(table, path):
+    """Streams a whole table into a CSV file, one DB-thread job per chunk so handlers interleave."""
+    total, after_key = 0, None
+    while True:
+        after_key, written = await run_db(database.export_csv_chunk, table, path, after_key)
+        total += written
+        if after_key is None:
+            return total
+
+# --- Blacklist ---
+
+async def add_to_blacklist(user_id):
+    await run_db(database.add_to_blacklist, user_id)
+
+# Memory-only lookup: no DB thread hop needed
+is_blacklisted = database.is_blacklisted
+
+# --- Feedback ---
+
+async def log_feedback(user_id, content):
+    await run_db(database.log_feedback, user_id, content)
+    feedback_limiter.record(user_id)
@@ -0,0 +1,232 @@
+"""Outbound Telegram send scheduler.
+
+Installed as the bot's rate limiter, so every Bot API call made anywhere in the
+handlers (reply_text, send_photo, edit_message_*, ...) passes through it:
+
+* a token bucket per chat (about 1 msg/s in private chats, 20 msg/min in groups/channels),
+* one global token bucket (about 30 msg/s for the whole bot), handed out by priority lane:
+  user replies first, then channel posts, then admin-group cosmetics,
+* automatic retry after RetryAfter instead of losing the message.
+"""
+import asyncio
+import datetime
+import heapq
+import itertools
+import logging
+import time
+from telegram.error import RetryAfter, TelegramError
+from telegram.ext import BaseRateLimiter
+from src.config import ADMIN_GROUP_ID, CHANNEL_ID
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+# --- PRIORITY LANES (lower goes first) ---
+USER = 0
+CHANNEL = 1
+ADMIN = 2
+LANE_NAMES = {USER: "user", CHANNEL: "channel", ADMIN: "admin"}
+
+class TokenBucket:
+    """Classic token bucket; reserve() may borrow from the future and says how long to wait."""
+    __slots__ = ("rate", "capacity", "tokens", "stamp")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_time(self, now):
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def reserve(self, now):
+        """Takes a token now and returns how many seconds to wait before using it."""
+        self._refill(now)
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def penalize(self, now, seconds):
+        """Blocks the bucket for `seconds` (used after Telegram answered RetryAfter)."""
+        self._refill(now)
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+    def is_idle(self, now):
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+class SendScheduler(BaseRateLimiter):
+    """Per-chat + global token buckets with priority lanes and RetryAfter handling.
+
+    `rate_limit_args` may be passed to any bot method to force a lane, e.g.
+    `context.bot.send_message(..., rate_limit_args=sender.ADMIN)`.
+    """
+
+    PURGE_EVERY = 1000  # requests between sweeps of idle per-chat buckets
+
+    def __init__(self, overall_rate=30, private_rate=1, private_burst=3,
+                 group_rate=20 / 60, group_burst=5, max_retries=3):
+        self.private_rate = private_rate
+        self.private_burst = private_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.max_retries = max_retries
+
+        self._global = TokenBucket(overall_rate, overall_rate)
+        self._chats = {}
+        self._waiters = []  # heap of (lane, seq, future)
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._dispatcher = None
+        self._paused_until = 0.0
+        self._requests = 0
+
+        self.sent = 0
+        self.retries = 0
+
+    async def initialize(self):
+        self._ensure_dispatcher()
+
+    async def shutdown(self):
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        for _, _, future in self._waiters:
+            future.cancel()
+        self._waiters.clear()
+
+    # --- Classification ---
+
+    @staticmethod
+    def lane_for(chat_id):
+        if chat_id is None:
+            return USER
+        if str(chat_id) == str(CHANNEL_ID):
+            return CHANNEL
+        if str(chat_id) == str(ADMIN_GROUP_ID):
+            return ADMIN
+        try:
+            return USER if int(chat_id) > 0 else ADMIN
+        except (TypeError, ValueError):
+            return CHANNEL  # "@channelusername"
+
+    def _chat_bucket(self, chat_id, now):
+        # ADMIN_GROUP_ID arrives as str from config but as int from update.effective_chat.id:
+        # one chat must map to one bucket
+        key = str(chat_id)
+        bucket = self._chats.get(key)
+        if bucket is None:
+            private = self.lane_for(chat_id) == USER
+            bucket = self._chats[key] = TokenBucket(
+                self.private_rate if private else self.group_rate,
+                self.private_burst if private else self.group_burst,
+            )
+
+        self._requests += 1
+        if self._requests % self.PURGE_EVERY == 0:
+            for stale in [k for k, b in self._chats.items() if k != key and b.is_idle(now)]:
+                del self._chats[stale]
+        return bucket
+
+    # --- Global bucket, handed out in lane order ---
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch(), name="send_scheduler")
+
+    async def _acquire_global(self, lane):
+        self._ensure_dispatcher()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (lane, next(self._seq), future))
+        self._wakeup.set()
+        await future
+
+    async def _dispatch(self):
+        while True:
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            delay = max(self._global.wait_time(now), self._paused_until - now)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():  # caller gave up while queued
+                continue
+            self._global.reserve(now)
+            future.set_result(None)
+
+    # --- BaseRateLimiter API ---
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        lane = rate_limit_args if rate_limit_args is not None else self.lane_for(chat_id)
+
+        for attempt in range(self.max_retries + 1):
+            # Calls that are not about a chat (getMe, answerCallbackQuery, ...) are not throttled
+            if chat_id is not None:
+                now = time.monotonic()
+                wait = self._chat_bucket(chat_id, now).reserve(now)
+                if wait:
+                    await asyncio.sleep(wait)
+                await self._acquire_global(lane)
+
+            start = time.perf_counter()
+            try:
+                result = await callback(*args, **kwargs)
+                self.sent += 1
+                return result
+            except RetryAfter as exc:
+                metrics.API_RETRY_AFTER.labels(endpoint).inc()
+                if attempt == self.max_retries:
+                    logger.error(f"{endpoint} to {chat_id} still flood-limited after {attempt} retries")
+                    raise
+                delay = exc.retry_after
+                if isinstance(delay, datetime.timedelta):
+                    delay = delay.total_seconds()
+                delay += 0.1
+                self.retries += 1
+                logger.info(f"RetryAfter on {endpoint} to {chat_id}: retrying in {delay:.1f}s")
+
+                now = time.monotonic()
+                if chat_id is not None:
+                    self._chat_bucket(chat_id, now).penalize(now, delay)
+                else:
+                    self._paused_until = max(self._paused_until, now + delay)
+                await asyncio.sleep(delay)
+            except TelegramError as exc:
+                metrics.API_ERRORS.labels(endpoint, type(exc).__name__).inc()
+                raise
+            finally:
+                metrics.API_LATENCY.labels(endpoint).observe(time.perf_counter() - start)
+
+    # --- Introspection ---
+
+    def queue_depths(self):
+        depths = {name: 0 for name in LANE_NAMES.values()}
+        for lane, _, future in self._waiters:
+            if not future.done():
+                depths[LANE_NAMES.get(lane, str(lane))] += 1
+        return depths
+
+    def stats(self):
+        return {
+            "sent": self.sent,
+            "retries": self.retries,
+            "chats": len(self._chats),
+            "queued": self.queue_depths(),
+        }
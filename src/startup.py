@@ -0,0 +1,31 @@
+"""Cold start timing: where the time between boot and the first handled update goes.
+
+src.main imports this before anything heavy, so STARTED is as close to process
+start as Python code gets (interpreter startup itself is not included). The
+breakdown is logged once, when the first update arrives.
+"""
+import time
+
+STARTED = time.perf_counter()
+
+_phases = []           # (phase, seconds) in the order they finished
+_last = STARTED
+
+def mark(phase):
+    """Closes `phase`: the time since the previous mark (or boot) is attributed to it."""
+    global _last
+    now = time.perf_counter()
+    _phases.append((phase, now - _last))
+    _last = now
+
+def phases():
+    return list(_phases)
+
+def since_boot():
+    return time.perf_counter() - STARTED
+
+def report():
+    """'imports 290 ms | schema 1 ms | ... | total 460 ms'"""
+    parts = [f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in _phases]
+    parts.append(f"total {(_last - STARTED) * 1000:.0f} ms")
+    return " | ".join(parts)
@@ -0,0 +1,84 @@
+"""Webhook runtime: a single uvicorn/Starlette server on the bot's own event loop.
+
+Receives Telegram updates on WEBHOOK_PATH and answers the health check on /,
+replacing both run_polling() and the Flask keep-alive thread. This port is public:
+/metrics gets a second listener on the private METRICS_PORT, on the same loop.
+"""
+import asyncio
+import contextlib
+import hmac
+import logging
+import uvicorn
+from prometheus_client import make_asgi_app
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, Response
+from starlette.routing import Route
+from telegram import Update
+from src.config import PORT, WEBHOOK_URL, WEBHOOK_SECRET, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_PATH = "/telegram"
+
+def create_asgi_app(application):
+    """Builds the ASGI app that feeds Telegram updates into the PTB Application."""
+
+    async def home(request):
+        return PlainTextResponse("Bot is alive!")
+
+    async def telegram_webhook(request):
+        # config.py refuses to start webhook mode without a secret: every update must carry it
+        token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(token.encode(), WEBHOOK_SECRET.encode()):
+            return Response(status_code=403)
+        try:
+            update = Update.de_json(await request.json(), application.bot)
+        except Exception as e:
+            logger.warning(f"Dropping malformed webhook payload: {e}")
+            return Response(status_code=400)
+        await application.update_queue.put(update)
+        return Response()
+
+    return Starlette(routes=[
+        Route("/", home),
+        Route(WEBHOOK_PATH, telegram_webhook, methods=["POST"]),
+    ])
+
+class SidecarServer(uvicorn.Server):
+    """A uvicorn server that leaves SIGINT/SIGTERM to the main one and is stopped by it."""
+
+    def capture_signals(self):
+        return contextlib.nullcontext()
+
+def _config(app, port):
+    return uvicorn.Config(app, host="0.0.0.0", port=port, log_level="warning", access_log=False)
+
+async def run_webhook(application):
+    """Registers the webhook and serves until SIGINT/SIGTERM (mirrors Application.run_polling)."""
+    server = uvicorn.Server(_config(create_asgi_app(application), PORT))
+    metrics_server = SidecarServer(_config(make_asgi_app(), METRICS_PORT)) if METRICS_PORT else None
+
+    async with application:  # initialize() ... shutdown()
+        if application.post_init:
+            await application.post_init(application)
+        await application.bot.set_webhook(
+            url=f"{WEBHOOK_URL.rstrip('/')}{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=Update.ALL_TYPES,
+            drop_pending_updates=False,
+        )
+        await application.start()
+        metrics_task = asyncio.create_task(metrics_server.serve()) if metrics_server else None
+        logger.info(f"Bot is serving webhook on port {PORT}, metrics on port {METRICS_PORT}")
+        try:
+            await server.serve()
+        finally:
+            if metrics_task:
+                metrics_server.should_exit = True
+                await metrics_task
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+
+    if application.post_shutdown:
+        await application.post_shutdown(application)
@@ -0,0 +1,5 @@
+import os
+
+# src.config refuses to import without a token; nothing in the tests talks to Telegram
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("BOT_MODE", "polling")
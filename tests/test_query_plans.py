@@ -0,0 +1,135 @@
+"""Query plans of every src.database helper.
+
+Each helper is replayed against a scratch DB and every statement it runs goes
+through EXPLAIN QUERY PLAN: nothing may fall back to a full table scan, and each
+helper must use the index it was written for (the planner can quietly pick a
+worse one, see get_unpublished_posts).
+"""
+import os
+import pytest
+from src import database
+
+# Helpers that read a whole table on purpose
+FULL_SCAN_ALLOWED = {"count_users", "load_blacklist", "load_persistence"}
+
+# Partial indexes holding only the rows still to process (empty in steady state): scanning them is fine
+PARTIAL_INDEXES = ("idx_posts_unmigrated", "idx_posts_unpublished")
+
+# FTS5 reads its own shadow tables (e.g. posts_fts_config after a schema change); not our queries
+FTS_SHADOW_PREFIX = "posts_fts_"
+
+# Helper -> what its plans must name (each entry must appear in at least one plan line)
+EXPECTED_INDEXES = {
+    "get_user": ["users USING INTEGER PRIMARY KEY"],
+    "get_users_page": ["users USING INTEGER PRIMARY KEY"],
+    "backfill_post_fields": ["idx_posts_unmigrated"],
+    "get_post": ["posts USING INTEGER PRIMARY KEY"],
+    "transition_post": ["posts USING INTEGER PRIMARY KEY"],
+    "update_post_message_id": ["posts USING INTEGER PRIMARY KEY"],
+    "count_pending_posts": ["idx_posts_status_"],
+    "get_pending_posts": ["idx_posts_status_created"],
+    "get_open_lost_found_posts": ["idx_posts_status_"],
+    "search_posts": ["posts_fts VIRTUAL TABLE", "p USING INTEGER PRIMARY KEY"],
+    "bulk_update_status": ["posts USING INTEGER PRIMARY KEY"],
+    "get_expired_posts": ["idx_posts_status_published"],
+    "get_unpublished_posts": ["idx_posts_unpublished"],
+    "record_publish_failure": ["posts USING INTEGER PRIMARY KEY"],
+    "renew_post": ["posts USING INTEGER PRIMARY KEY"],
+    "archive_closed_posts": ["idx_posts_status_created"],
+    "archive_old_feedback": ["idx_feedback_created"],
+    "get_post_times_since": ["idx_posts_created"],
+    "get_feedback_times_since": ["idx_feedback_created"],
+    "export_csv_chunk": ["INTEGER PRIMARY KEY"],
+    "save_persistence": ["persistence USING PRIMARY KEY"],
+    "get_user_channel_posts": ["idx_posts_user_created", "idx_posts_archive_user"],
+    "delete_user_data": ["idx_posts_user_created", "idx_posts_archive_user"],
+}
+
+# (helper, args) pairs covering every query in src.database
+CALLS = [
+    (database.register_seller, (1, "user", "Name", "0911000000", "DBU0000001", "Main")),
+    (database.get_user, (1,)),
+    (database.count_users, ()),
+    (database.get_users_page, ()),
+    (database.get_users_page, (None, 5)),
+    (database.create_post, (1, "SELL", "Books", "New", "Title", "Main", "Desc", "100", "photo")),
+    (database.backfill_post_fields, ()),
+    (database.get_post, (1,)),
+    (database.transition_post, (1, "PENDING", "APPROVED")),
+    (database.update_post_message_id, (1, 10)),
+    (database.count_pending_posts, ()),
+    (database.get_pending_posts, ()),
+    (database.get_open_lost_found_posts, ()),
+    (database.search_posts, ('"title"*', "books", "new", 10, 500, (-1.0, 0))),
+    (database.bulk_update_status, ([1], "APPROVED", "SOLD")),
+    (database.get_expired_posts, (86400,)),
+    (database.get_unpublished_posts, (86400, 3)),
+    (database.record_publish_failure, (1,)),
+    (database.renew_post, (1,)),
+    (database.archive_closed_posts, (90,)),
+    (database.archive_old_feedback, (180,)),
+    (database.get_post_times_since, (86400,)),
+    (database.add_to_blacklist, (2,)),
+    (database.load_blacklist, ()),
+    (database.log_feedback, (1, "Nice bot")),
+    (database.get_feedback_times_since, (86400,)),
+    (database.export_csv_chunk, ("users", os.devnull)),
+    (database.export_csv_chunk, ("posts", os.devnull, 0)),
+    (database.export_csv_chunk, ("posts_archive", os.devnull, 0)),
+    (database.save_persistence, ([("user", "1", "{}")], [("user", "2")])),
+    (database.load_persistence, ()),
+    (database.get_user_channel_posts, (1,)),
+    (database.delete_user_data, (1,)),
+]
+
+@pytest.fixture(scope="module")
+def plans(tmp_path_factory):
+    """[(helper, sql, plan lines)] for every SELECT/UPDATE/DELETE the helpers run on a temp DB."""
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(database, "DB_PATH", str(tmp_path_factory.mktemp("plans") / "market.db"))
+        mp.setattr(database, "_blacklist", set())
+        database.close_connection()
+        try:
+            database.init_db()
+            conn = database.get_connection()
+            statements = []
+            for func, args in CALLS:
+                conn.set_trace_callback(lambda sql, name=func.__name__: statements.append((name, sql)))
+                try:
+                    func(*args)
+                finally:
+                    conn.set_trace_callback(None)
+
+            yield [
+                (name, " ".join(sql.split()), [row["detail"] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)])
+                for name, sql in statements
+                if sql.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE", "WITH"))
+            ]
+        finally:
+            database.close_connection()
+
+def _is_full_scan(detail):
+    if not detail.startswith("SCAN ") or detail == "SCAN CONSTANT ROW" or "VIRTUAL TABLE" in detail:
+        return False
+    if FTS_SHADOW_PREFIX in detail:
+        return False
+    return not any(detail.endswith(f"USING INDEX {index}") for index in PARTIAL_INDEXES)
+
+def check_query_plans(plans):
+    """(helper, sql, plan) for every statement that scans a whole table."""
+    return [(name, sql, plan) for name, sql, plan in plans
+            if name not in FULL_SCAN_ALLOWED and any(_is_full_scan(detail) for detail in plan)]
+
+def test_no_full_scans(plans):
+    assert check_query_plans(plans) == []
+
+def test_every_query_has_an_expected_plan(plans):
+    helpers = {name for name, _, _ in plans}
+    assert helpers - FULL_SCAN_ALLOWED - set(EXPECTED_INDEXES) == set()
+
+@pytest.mark.parametrize("helper", sorted(EXPECTED_INDEXES))
+def test_helper_uses_its_index(plans, helper):
+    details = [detail for name, _, plan in plans if name == helper for detail in plan]
+    assert details, f"{helper} ran no query"
+    for expected in EXPECTED_INDEXES[helper]:
+        assert any(expected in detail for detail in details), f"{helper} does not use {expected}: {details}"